@@ -0,0 +1,46 @@
+"""
+build_catenary_table.py — precompute the catenary lookup table read by cat2.CatenaryTable.
+
+Profiles are stored normalised to unit length, so one table serves every
+tether length up to TETHER_LENGTH. The script reports the worst
+interpolation error at full tether length against the exact solver, to be
+compared with UAV_RADIUS.
+
+Usage:
+    python build_catenary_table.py
+and then point CATENARY_TABLE in constants.py to the written file.
+"""
+
+import numpy as np
+
+from cat2 import CatenaryTable, build_catenary_table, catenary_profiles
+from constants import *
+
+TABLE_PATH = "scenarios/catenary_table.npy"
+N_THETA    = 301
+N_PHI      = 301
+N_POINTS   = 50
+N_SAMPLES  = 2000
+
+
+def table_error(table, n_samples=N_SAMPLES, seed=0):
+    """Max deviation (m) between interpolated and exact profiles of TETHER_LENGTH tethers."""
+    rng = np.random.default_rng(seed)
+    worst = 0.
+    for _ in range(n_samples):
+        chord = TETHER_LENGTH*np.cos(rng.uniform(0., table.PHI_MAX))
+        theta = rng.uniform(-table.THETA_MAX, table.THETA_MAX)
+        dh, dz = chord*np.cos(theta), chord*np.sin(theta)
+        exact = catenary_profiles(dh, dz, [TETHER_LENGTH], table.n_points)
+        approx = table.get_profiles(dh, dz, [TETHER_LENGTH], table.n_points)
+        worst = max(worst, np.abs(exact - approx).max())
+    return worst
+
+
+if __name__ == "__main__":
+
+    np.save(TABLE_PATH, build_catenary_table(N_THETA, N_PHI, N_POINTS))
+    print(f"Saved: {TABLE_PATH}  ({N_THETA}×{N_PHI} profiles, {N_POINTS} points)")
+
+    err = table_error(CatenaryTable(TABLE_PATH))
+    print(f"Max interpolation error at L={TETHER_LENGTH}: {err:.4f} m  (UAV_RADIUS={UAV_RADIUS})")
@@ -1,99 +1,632 @@
 import matplotlib.pyplot as plt
 import numpy as np
 
-from pycatenary import cable
 from tools import *
 from bisect import bisect
+from collections import OrderedDict
 from drawing import *
 
 
-def get_min_catenary_rectangles(top, T, obstacles, Lmin, Lmax, k_length, col2 = False):    
+def catenary_shapes(tops, Ts, lengths, n_points=50):
+    '''
+    Vectorized version of cable.MooringLine(L=l, w=0, EA=None, anchor=[0,0,0], fairlead=T-top, floor=False)
+    followed by s2xyz over np.linspace(0., l, n_points), for every length at once.
+
+    tops and Ts are (..., 3) arrays (a single pair or a batch of pairs) and lengths is (..., k), 
+    either shared by all pairs or one sweep per pair. Returns a (..., k, n_points, 3) array with 
+    the points relative to top, exactly as pycatenary lays them out.
+    '''
+    f = np.asarray(Ts, dtype=float) - np.asarray(tops, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dh = np.sqrt(f[..., 0]**2 + f[..., 1]**2)
+        direction = (f[..., :2] / dh[..., None])[..., None, None, :]
+
+    return profiles_to_shapes(catenary_profiles(dh, f[..., 2], lengths, n_points), direction)
+
+
+def catenary_profiles(dh, dz, lengths, n_points=50, s=None):
+    '''
+    Catenary points in the vertical plane of the tether, as (horizontal, vertical) offsets from the top,
+    for a T placed dh away horizontally and dz above it. Shapes: dh, dz (...), lengths (..., k), 
+    result (..., k, n_points, 2).
+
+    's' (..., k, m) samples the given arc lengths from the top instead of n_points evenly spaced ones
+    '''
+    dh, dz = np.asarray(dh, dtype=float), np.asarray(dz, dtype=float)
+    L = np.asarray(lengths, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        up = (dz > 0)[..., None, None]
+        L, dh, dv = np.broadcast_arrays(L, dh[..., None], np.abs(dz)[..., None])
+
+        a = catenary_parameter(dh, dv, L)
+        log_span = np.log((L + dv)/(L - dv))
+        x_offset = -0.5*(a*log_span - dh)
+        y_offset = dv - a*np.cosh(0.5*(a*log_span + dh)/a)
+        s_offset = -a*np.sinh(x_offset/a)
+
+        # pycatenary walks the line from the lowest end, so reverse s when T is below the top
+        s = np.linspace(0., L, n_points, axis=-1) if s is None else np.asarray(s, dtype=float)
+        s = np.where(up, s, L[..., None] - s)
+        x = a[..., None]*np.arcsinh((s + s_offset[..., None])/a[..., None])
+        y = a[..., None]*np.cosh(x/a[..., None])
+        x, y = x + x_offset[..., None], y + y_offset[..., None]
+
+        profiles = np.empty(s.shape + (2,))
+        profiles[..., 0] = np.where(up, x, dh[..., None] - x)
+        profiles[..., 1] = np.where(up, y, y - dv[..., None])
+
+    return profiles
+
+
+def catenary_arcs(dh, dz, lengths):
+    '''
+    (h0, a, c) of the catenaries of catenary_profiles written as v = a*cosh((h - h0)/a) + c, 0 <= h <= dh, 
+    in the same (horizontal, vertical) offsets from the top. Shapes: dh, dz (...), lengths and results (..., k).
+    '''
+    dh, dz = np.asarray(dh, dtype=float), np.asarray(dz, dtype=float)
+    L = np.asarray(lengths, dtype=float)
+
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        up = (dz > 0)[..., None]
+        L, dh, dv = np.broadcast_arrays(L, dh[..., None], np.abs(dz)[..., None])
+
+        a = catenary_parameter(dh, dv, L)
+        x_offset = -0.5*(a*np.log((L + dv)/(L - dv)) - dh)
+        y_offset = dv - a*np.cosh((dh - x_offset)/a)
+
+    return np.where(up, x_offset, dh - x_offset), a, np.where(up, y_offset, y_offset - dv)
+
+def catenary_arc(dh, dz, L, tol=10**-12, maxit=100):
+    '''
+    Scalar catenary_arcs for a single length, without the array overhead (nan when it cannot be solved)
+    '''
+    dv = abs(dz)
+    try:
+        r = math.sqrt(L**2 - dv**2)/dh
+        u = min(math.sqrt(6*(r-1)), 2*math.log(4*r))
+        for _ in range(maxit):
+            sh, ch = math.sinh(u), math.cosh(u)
+            du = (sh/u - r)/((u*ch - sh)/u**2)
+            u -= du
+            if abs(du) <= tol*u:
+                break
+
+        a = dh/(2*u)
+        x_offset = -0.5*(a*math.log((L + dv)/(L - dv)) - dh)
+        y_offset = dv - a*math.cosh((dh - x_offset)/a)
+    except (ValueError, ZeroDivisionError, OverflowError):
+        return math.nan, math.nan, math.nan
+
+    return (x_offset, a, y_offset) if dz > 0 else (dh - x_offset, a, y_offset - dv)
+
+
+def profiles_to_shapes(profiles, direction):
+    '''
+    Lay (..., 2) catenary profiles along the horizontal unit vector(s) direction, relative to the top
+    '''
+    xyzs = np.empty(profiles.shape[:-1] + (3,))
+    xyzs[..., :2] = profiles[..., :1]*direction
+    xyzs[..., 2] = profiles[..., 1]
+    return xyzs
+
+
+def catenary_parameter(dh, dv, L, tol=10**-12, maxit=100):
+    '''
+    Catenary parameter a of the fully lifted rigid line, i.e. the root of 2a*sinh(dh/2a) = sqrt(L^2 - dv^2)
+    (same equation pycatenary bisects), solved element-wise.
+
+    With u = dh/2a it becomes sinh(u)/u = r, a convex increasing function of u, so Newton started 
+    from an upper bound of the root converges monotonically.
+    '''
+    r = np.sqrt(L**2 - dv**2)/dh
+    u = np.minimum(np.sqrt(6*(r-1)), 2*np.log(4*r))
+    for _ in range(maxit):
+        sh, ch = np.sinh(u), np.cosh(u)
+        du = (sh/u - r)/((u*ch - sh)/u**2)
+        u = u - du
+        if not np.any(np.abs(du) > tol*u):
+            break
+
+    return dh/(2*u)
+
+
+class CatenaryProfiles:
+    '''
+    Base for the catenary profile providers: subclasses implement get_profiles(dh, dz, lengths, n_points)
+    '''
+    def get_shapes(self, top, T, lengths, n_points=50):
+        '''
+        Counterpart of catenary_shapes for a single (top, T) pair
+        '''
+        f = np.asarray(T, dtype=float) - np.asarray(top, dtype=float)
+        dh = math.sqrt(f[0]**2 + f[1]**2)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            direction = f[:2] / dh
+
+        return profiles_to_shapes(self.get_profiles(dh, f[2], lengths, n_points), direction)
+
+
+class CatenaryCache(CatenaryProfiles):
+    ''' 
+    Bounded LRU memo of catenary profiles. A profile only depends on the horizontal offset dh, 
+    the vertical offset dz and the length L between top and T, so it is keyed by those values 
+    quantized to 'quantum' and shared by every take-off point with the same relative geometry 
+    (e.g. the same sample index on every vertical plane, or the same point for a nearby target).
+    '''
+    def __init__(self, maxsize=10**4, quantum=EPSILON):
+        self.maxsize = maxsize
+        self.quantum = quantum
+        self.profiles = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.profiles)
+
+    def keys(self, dh, dz, lengths, n_points):
+        q = self.quantum
+        qdh, qdz = round(dh/q), round(dz/q)
+        return [(n_points, qdh, qdz, qL) for qL in np.rint(np.asarray(lengths)/q).astype(np.int64).tolist()]
+
+    def clear(self):
+        self.profiles.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_profiles(self, dh, dz, lengths, n_points=50):
+        '''
+        (k, n_points, 2) profiles for every length, solving only the ones not cached yet
+        '''
+        keys = self.keys(dh, dz, lengths, n_points)
+        profiles = [self.profiles.get(k) for k in keys]
+
+        missing = [i for i, p in enumerate(profiles) if p is None]
+        self.hits += len(keys) - len(missing)
+        self.misses += len(missing)
+        for k, p in zip(keys, profiles):
+            if p is not None:
+                self.profiles.move_to_end(k)
+
+        if missing:
+            solved = catenary_profiles(dh, dz, np.asarray(lengths)[missing], n_points)
+            for i, p in zip(missing, solved):
+                profiles[i] = p
+                self.profiles[keys[i]] = p
+            while len(self.profiles) > self.maxsize:
+                self.profiles.popitem(last=False)
+
+        return np.stack(profiles)
+
+
+class CatenaryTable(CatenaryProfiles):
+    '''
+    Catenary profiles interpolated from the table written by build_catenary_table.py.
+
+    Profiles are scale free (the one of (dh, dz, L) is L times the one of (dh/L, dz/L, 1)), so the table
+    only spans the direction of the chord, theta = atan2(dz, dh), and its slack, phi = arccos(chord/L).
+    The .npy file is memory-mapped: loading it reads nothing and every process shares the same pages.
+    Geometries outside the table (almost vertical or extremely slack tethers) are solved instead.
+    '''
+    THETA_MAX = math.pi/2 - 0.01
+    PHI_MAX = math.acos(0.01)
+
+    def __init__(self, path):
+        self.profiles = np.load(path, mmap_mode="r")
+        n_theta, n_phi, self.n_points, _ = self.profiles.shape
+        self.theta_step = 2*self.THETA_MAX/(n_theta-1)
+        self.phi_step = self.PHI_MAX/(n_phi-1)
+
+    def get_profiles(self, dh, dz, lengths, n_points=50):
+        '''
+        (k, n_points, 2) profiles for every length, bilinearly interpolated in (theta, phi)
+        '''
+        L = np.asarray(lengths, dtype=float)
+        if n_points != self.n_points:
+            return catenary_profiles(dh, dz, L, n_points)
+
+        theta = math.atan2(dz, dh)
+        phi = np.arccos(np.minimum(math.sqrt(dh**2 + dz**2)/L, 1.))
+        P = self.profiles
+
+        fi = (theta + self.THETA_MAX)/self.theta_step
+        fj = phi/self.phi_step
+        i = min(max(int(fi), 0), P.shape[0]-2)
+        j = np.clip(fj.astype(int), 0, P.shape[1]-2)
+        u, v = fi - i, (fj - j)[:, None, None]
+
+        profiles = (1-u)*((1-v)*P[i, j] + v*P[i, j+1]) + u*((1-v)*P[i+1, j] + v*P[i+1, j+1])
+        profiles *= L[:, None, None]
+        # pin the profiles on T, interpolation alone misses it slightly
+        profiles -= np.linspace(0., 1., n_points)[:, None]*(profiles[:, -1] - [dh, dz])[:, None]
+
+        outside = (phi > self.PHI_MAX) | (abs(theta) > self.THETA_MAX)
+        if np.any(outside):
+            profiles[outside] = catenary_profiles(dh, dz, L[outside], n_points)
+
+        return profiles
+
+
+def build_catenary_table(n_theta=301, n_phi=301, n_points=50):
+    '''
+    Unit length profiles on the (theta, phi) grid read by CatenaryTable, as a float32 array
+    '''
+    theta = np.linspace(-CatenaryTable.THETA_MAX, CatenaryTable.THETA_MAX, n_theta)
+    phi = np.linspace(0., CatenaryTable.PHI_MAX, n_phi)
+    theta, phi = np.meshgrid(theta, phi, indexing="ij")
+    chord = np.cos(phi)
+
+    profiles = catenary_profiles(chord*np.cos(theta), chord*np.sin(theta), np.ones((n_theta, n_phi, 1)), n_points)[..., 0, :, :]
+    # phi = 0 is the straight tether, which the solver cannot represent
+    profiles[:, 0] = np.linspace(0., 1., n_points)[:, None]*np.stack([np.cos(theta[:, 0]), np.sin(theta[:, 0])], axis=-1)[:, None]
+
+    return profiles.astype(np.float32)
+
+
+CATENARY_CACHE = CatenaryCache() if CATENARY_TABLE is None else CatenaryTable(CATENARY_TABLE)
+
+
+class CatenaryResolution:
+    '''
+    Sampling policy for catenaries: points every 'spacing' metres along the tether (at least min_points),
+    refined to 'fine_spacing' on the stretches that pass near an obstacle. A stretch between two samples
+    lies within half its length of them, so stretches whose box inflated by that much misses every 
+    obstacle box cannot collide and keep the coarse spacing.
+    '''
+    def __init__(self, fine_spacing, spacing=2*UAV_RADIUS, min_points=5):
+        self.fine_spacing = fine_spacing
+        self.spacing = spacing
+        self.min_points = min_points
+
+    @classmethod
+    def from_obstacles(cls, obstacles, spacing=2*UAV_RADIUS, min_points=5):
+        '''
+        Policy whose fine spacing is the thinnest obstacle side (e.g. the 1 m roofs of S2), capped at UAV_RADIUS
+        '''
+        bounds = get_obstacles_bounds(obstacles)
+        sides = bounds[:, 3:] - bounds[:, :3]
+        sides = sides[sides > EPSILON]
+        thickness = sides.min() if len(sides) else UAV_RADIUS
+        return cls(min(thickness, UAV_RADIUS), spacing, min_points)
+
+    def n_points(self, L):
+        return max(self.min_points, math.ceil(L/self.spacing) + 1)
+
+    def sample(self, top, T, lengths, bounds, cache=None):
+        '''
+        Points of the catenaries of the given lengths from top to T, relative to top, one array per length 
+        and lazily. 'bounds' are the (N, 6) obstacle boxes, also relative to top.
+        '''
+        n = self.n_points(max(lengths))
+        shapes = catenary_shapes(top, T, lengths, n) if cache is None else cache.get_shapes(top, T, lengths, n)
+        for L, xyzs in zip(lengths, shapes):
+            yield self.refine(top, T, L, xyzs, bounds)
+
+    def refine(self, top, T, L, xyzs, bounds):
+        '''
+        Add fine_spacing points to the stretches of the evenly sampled catenary xyzs that pass near the bounds
+        '''
+        n = len(xyzs)
+        step = L/(n-1)
+        if not len(bounds) or step <= self.fine_spacing:
+            return xyzs
+
+        lo = np.minimum(xyzs[:-1], xyzs[1:]) - step/2
+        hi = np.maximum(xyzs[:-1], xyzs[1:]) + step/2
+        near = np.any(np.all(lo[:, None] <= bounds[None, :, 3:], axis=-1) & np.all(hi[:, None] >= bounds[None, :, :3], axis=-1), axis=1)
+        if not np.any(near):
+            return xyzs
+
+        k = math.ceil(step/self.fine_spacing)
+        s = (np.flatnonzero(near)[:, None] + np.arange(1, k)/k).ravel()*step
+        f = np.asarray(T, dtype=float) - np.asarray(top, dtype=float)
+        dh = math.sqrt(f[0]**2 + f[1]**2)
+        extra = profiles_to_shapes(catenary_profiles(dh, f[2], [L], s=s[None]), f[:2]/dh)[0]
+
+        order = np.argsort(np.concatenate([np.arange(n)*step, s]), kind="stable")
+        return np.concatenate([xyzs, extra])[order]
+
+
+def catenary_bounds(top, T):
+    '''
+    Corners of a box holding every catenary from top to T: they stay over the horizontal box of both ends 
+    and, being convex, never rise above the highest one (the ground check bounds them from below)
+    '''
+    ends = np.array([top, T], dtype=float)
+    lo, hi = ends.min(axis=0) - EPSILON, ends.max(axis=0) + EPSILON
+    lo[2] = -np.inf
+    return lo, hi
+
+
+def get_min_catenary_rectangles(top, T, obstacles, Lmin, Lmax, k_length, col2 = False, cache=CATENARY_CACHE, length_tol=None, resolution=None, exact=False, index=None):    
     '''
     Take k_length lengths between the straight line and the L_max
     
     'min_cat_delta' evita que la libreria te de error con la primera catenaria por ser una recta
+
+    Shapes are taken from 'cache' (a CatenaryCache or CatenaryTable) when given, cache=None always solves them
+
+    With 'length_tol' the first collision free length of the scan is refined by bisection down to that
+    tolerance, between it and the previous (colliding) length, or scanned at that tolerance when feasibility is
+    seen not to be monotone there (see bisect_min_catenary)
+
+    'resolution' (a CatenaryResolution) replaces the fixed 50 points per catenary by its adaptive sampling
+
+    With 'exact' collisions are decided on the catenary itself against the obstacle boxes (see 
+    cat_boxes_collision), the sampled points are then only returned. When the shortest length collides, the
+    envelope swept by all the lengths (see catenary_envelope) is then tested before going on: a blocked 
+    envelope discards the top, otherwise the sweep only checks the obstacles it meets. The sampled checks
+    are not bounded by that envelope and keep every obstacle.
+
+    An 'index' (ObstacleIndex over the obstacles) narrows them down to those near catenary_bounds(top, T)
     '''
 
-    tt = 0
-    # Compute Lmin the same way pycatenary does internally (split h/v) to avoid
-    # floating-point mismatch that causes "length inferior to distance" RuntimeError.
+    # the chord, from the same h/v split the catenary solver takes: the lengths start EPSILON above it, as at
+    # the chord itself the tether is straight and catenary_parameter has no solution
     f_vec = T - top
     dh = np.sqrt(f_vec[0]**2 + f_vec[1]**2)
     dv = abs(f_vec[2])
     Lmin = np.sqrt(dh**2 + dv**2)
-    for l in np.linspace(Lmin + EPSILON, Lmax - EPSILON, k_length):
-
-        a = [0,0,0]
-        f = T - top
-        l1 = cable.MooringLine(L=l, w=0, EA=None, anchor=a, fairlead=f, floor=False)
-        try:
-            l1.computeSolution()
-        except RuntimeError:
-            continue
+    if index is not None:
+        obstacles, boxes = index.candidates(*catenary_bounds(top, T))
+    else:
+        boxes = get_obstacles_bounds(obstacles)
 
-        xyzs = []
-        for s in np.linspace(0., l):
-            xyz = l1.s2xyz(s)
-            xyzs.append(xyz)
+    if resolution is None:
+        get_shapes = lambda lengths: catenary_shapes(top, T, lengths) if cache is None else cache.get_shapes(top, T, lengths)
+    else:
+        bounds = boxes - np.concatenate([top, top])
+        get_shapes = lambda lengths: resolution.sample(top, T, lengths, bounds, cache)
 
-        if xyzs[0][0] == None or math.isnan(xyzs[0][0]):
-            return None, -1, tt
-        
-        if xyzs[0][-1] < 0:
-            xyzs += np.array([0,0,-xyzs[0][-1]]) + top
-        else:
-            xyzs += top
-        
-        if euclidian_distance_lists(xyzs[-1], T) > 2*UAV_RADIUS:
+    if exact:
+        check = lambda l, xyzs: check_catenary_exact(xyzs, top, T, catenary_arc(dh, f_vec[2], l), boxes)
+    else:
+        check = lambda l, xyzs: check_catenary(xyzs, top, T, obstacles, col2, boxes)
+
+    tt = 0
+    prev_l = None
+    lengths = np.linspace(Lmin + EPSILON, Lmax - EPSILON, k_length)
+    for l, xyzs in zip(lengths, get_shapes(lengths)):
+
+        if l < Lmin:
             continue
 
+        xyzs, status, t = check(l, xyzs)
+        tt += t
+        if status == 1:
+            if length_tol is not None and prev_l is not None:
+                xyzs, l, t = bisect_min_catenary(prev_l, l, xyzs, length_tol, get_shapes, check)
+                tt += t
+            return xyzs, l, tt
+        if status == -1:
+            return None, -1, tt
 
-        for xyz in xyzs:
-            if xyz[-1] <= 0:
+        if prev_l is None and exact:
+            # the shortest length collides: settle the whole family with the envelope it sweeps (blocked 
+            # discards the top), or else sweep the rest against the obstacles the envelope meets only
+            t = time.time()
+            sweep, meets = catenary_envelope(top, T, catenary_arc(dh, f_vec[2], lengths[-1]), boxes)
+            tt += time.time() - t
+            if sweep == -1:
                 return None, -1, tt
-                
-        if col2: 
-            is_collision_cat_obs = lambda oi: cat_rectangle_collision2(oi, xyzs)
-        else:
-            is_collision_cat_obs = lambda oi: cat_rectangle_collision(oi, xyzs)
-
-
-        collision = False
-        for oi in obstacles:  
-            t = time.time()  
-            if is_collision_cat_obs(oi):
-                for v in oi:
-                    if v[-1] == 0:
-                        return None, -1, tt
-                    
-                # fig = plt.figure()
-                # ax = fig.add_subplot(111, projection='3d')
-                # ax.set_xlabel('X Axis')
-                # ax.set_ylabel('Y Axis')
-                # ax.set_zlabel('Z Axis')
-                # xx, yy, zz = zip(*xyzs)
-                
-                # for v1 in oi:
-                #     for v2 in oi:
-                #         plt.plot([v1[0], v2[0]],[v1[1], v2[1]],[v1[2], v2[2]], "-k")
+            obstacles, boxes = [oi for oi, m in zip(obstacles, meets) if m], boxes[meets]
 
-                # plt.plot(xx, yy, zz, '-b')  
-                # plt.title("NO") 
-                # plt.show() 
+        prev_l = l
+    
+    return None, -1, tt
 
 
-                collision = True
+def bisect_min_catenary(lo, hi, hi_xyzs, tol, get_shapes, check, n_checks=4):
+    '''
+    Bisect the first collision free length between lo (colliding) and hi (collision free, hi_xyzs)
+    until the bracket is narrower than tol, checking each length l and its shape with check(l, xyzs).
+    Bisection assumes feasibility monotone inside the bracket. When it shows it is not, a length in between 
+    discarding the top, or one of the n_checks evenly spaced lengths of the bracket below the result (those
+    not bisected yet) being collision free, the bracket is scanned linearly at tol spacing instead. A 
+    collision free stretch that none of those lengths falls in still goes unseen.
+    '''
+    tt = 0
+    def probe(l):
+        nonlocal tt
+        xyzs, = get_shapes([l])
+        xyzs, status, t = check(l, xyzs)
+        tt += t
+        return xyzs, status
+
+    first, last, last_xyzs = lo, hi, hi_xyzs
+    probed, monotone = [], True
+    while hi - lo > tol:
+        mid = (lo + hi)/2
+        xyzs, status = probe(mid)
+        probed.append(mid)
+        if status == 1:
+            hi, hi_xyzs = mid, xyzs
+        elif status == 0:
+            lo = mid
+        else:
+            monotone = False
+            break
+
+    if monotone:
+        # below the result every length should collide
+        for l in np.linspace(first, last, n_checks + 1)[1:-1]:
+            if l < hi and all(abs(l - m) > tol/2 for m in probed) and probe(l)[1] != 0:
+                monotone = False
                 break
-            tt += time.time() - t                
-            
-        if collision:
-            continue 
 
-        return xyzs, l, tt
+    if monotone:
+        return hi_xyzs, hi, tt
+
+    for l in np.arange(first + tol, last, tol):
+        xyzs, status = probe(l)
+        if status == 1:
+            return xyzs, l, tt
+
+    return last_xyzs, last, tt
+
+
+def check_catenary(xyzs, top, T, obstacles, col2 = False, bounds = None):
+    '''
+    Place a catenary computed relative to top and check it against the obstacles.
+
+    Returns the placed points and a status: 1 collision free, 0 this length does not work, 
+    -1 the top must be discarded (the tether touches the ground or a ground obstacle)
+
+    col2 checks the points against the obstacle boxes, given precomputed as 'bounds' (see get_obstacles_bounds)
+    '''
+    tt = 0
+    if xyzs[0][0] == None or math.isnan(xyzs[0][0]):
+        return None, -1, tt
     
-    return None, -1, tt
+    lift = np.array([0,0,-xyzs[0][-1]]) if xyzs[0][-1] < 0 else 0
+
+    # check that the end reaches T before placing the whole profile
+    if euclidian_distance_lists(xyzs[-1] + lift + top, T) > 2*UAV_RADIUS:
+        return None, 0, tt
+
+    xyzs = xyzs + lift + top
 
+    if np.any(xyzs[:, 2] <= 0):
+        return xyzs, -1, tt
             
+    if col2:
+        t = time.time()
+        if bounds is None:
+            bounds = get_obstacles_bounds(obstacles)
+        first = first_box_hit(xyzs, bounds)
+        tt += time.time() - t
+        if first < 0:
+            return xyzs, 1, tt
+        return xyzs, -1 if bounds[first, 2] == 0 else 0, tt
+
+    is_collision_cat_obs = lambda oi: cat_rectangle_collision(oi, xyzs)
+
+    for oi in obstacles:  
+        t = time.time()  
+        if is_collision_cat_obs(oi):
+            for v in oi:
+                if v[-1] == 0:
+                    return xyzs, -1, tt
+                
+            # fig = plt.figure()
+            # ax = fig.add_subplot(111, projection='3d')
+            # ax.set_xlabel('X Axis')
+            # ax.set_ylabel('Y Axis')
+            # ax.set_zlabel('Z Axis')
+            # xx, yy, zz = zip(*xyzs)
+            
+            # for v1 in oi:
+            #     for v2 in oi:
+            #         plt.plot([v1[0], v2[0]],[v1[1], v2[1]],[v1[2], v2[2]], "-k")
+
+            # plt.plot(xx, yy, zz, '-b')  
+            # plt.title("NO") 
+            # plt.show() 
+
+
+            return xyzs, 0, tt
+        tt += time.time() - t                
+
+    return xyzs, 1, tt
+
+
+def check_catenary_exact(xyzs, top, T, arc, bounds):
+    '''
+    check_catenary deciding the ground and obstacle contacts on the catenary arc = (h0, a, c) (see catenary_arcs)
+    rather than on its points xyzs, which are only placed and returned. 'bounds' are the (N, 6) obstacle boxes.
+    '''
+    tt = 0
+    if xyzs[0][0] == None or math.isnan(xyzs[0][0]):
+        return None, -1, tt
+
+    lift = np.array([0,0,-xyzs[0][-1]]) if xyzs[0][-1] < 0 else 0
+
+    if euclidian_distance_lists(xyzs[-1] + lift + top, T) > 2*UAV_RADIUS:
+        return None, 0, tt
+
+    xyzs = xyzs + lift + top
+    origin = top + lift
+
+    t = time.time()
+    h0, a, c = arc
+    dh = math.sqrt((T[0] - origin[0])**2 + (T[1] - origin[1])**2)
+    if a*math.cosh((min(max(h0, 0), dh) - h0)/a) + c + origin[2] <= 0:
+        return xyzs, -1, tt
+
+    hits = cat_boxes_collision(origin, T, arc, bounds)
+    tt += time.time() - t
+
+    if np.any(hits & (bounds[:, 2] == 0)):
+        return xyzs, -1, tt
+    if np.any(hits):
+        return xyzs, 0, tt
+
+    return xyzs, 1, tt
+
+
+def boxes_stretch(origin, T, bounds):
+    '''
+    Horizontal distance dh from origin to T and, for each of the (N, 6) boxes [xmin, ymin, zmin, xmax, ymax, zmax],
+    the stretch [h1, h2] of 0 <= h <= dh over which the vertical plane from origin to T crosses it (empty if h1 > h2)
+    '''
+    f = np.asarray(T, dtype=float)[:2] - origin[:2]
+    dh = math.sqrt(f[0]**2 + f[1]**2)
+    u = f/dh
+
+    lo, hi = bounds[:, :2] - origin[:2], bounds[:, 3:5] - origin[:2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1, t2 = lo/u, hi/u
+    inside = (lo <= 0) & (hi >= 0)
+    t1, t2 = np.where(u != 0, np.minimum(t1, t2), np.where(inside, -np.inf, np.inf)), \
+             np.where(u != 0, np.maximum(t1, t2), np.where(inside, np.inf, -np.inf))
+
+    return dh, np.maximum(t1.max(axis=1), 0), np.minimum(t2.min(axis=1), dh)
+
+
+def cat_boxes_collision(origin, T, arc, bounds):
+    '''
+    Exact test of the catenary arc = (h0, a, c) laid from origin towards T against the (N, 6) boxes 
+    [xmin, ymin, zmin, xmax, ymax, zmax]. The x and y sides of a box bound the horizontal stretch [h1, h2] 
+    of the arc above it; the arc being convex, its lowest point there is the vertex clipped to [h1, h2] and
+    its highest one is at h1 or h2, so it crosses the box iff that range of heights meets [zmin, zmax].
+    '''
+    h0, a, c = arc
+    dh, h1, h2 = boxes_stretch(origin, T, bounds)
+
+    height = lambda h: a*np.cosh((h - h0)/a) + c + origin[2]
+    with np.errstate(invalid="ignore", over="ignore"):
+        lowest = height(np.clip(h0, h1, np.maximum(h1, h2)))
+        highest = np.maximum(height(h1), height(h2))
+
+    return (h1 <= h2) & (lowest <= bounds[:, 5]) & (highest >= bounds[:, 2])
+
+
+def catenary_envelope(top, T, arc, bounds):
+    '''
+    Catenaries from top to T are nested, the longer below the shorter, so all of them up to the one of 
+    parameters arc = (h0, a, c) sweep the region between it and the chord. Returns -1 if a box rising from
+    the ground over the chord blocks every length, and otherwise 0 with the (N,) mask of the boxes that 
+    meet that region: the only ones any of those lengths can hit.
+    '''
+    h0, a, c = arc
+    dh, h1, h2 = boxes_stretch(top, T, bounds)
+    if not (dh > 0 and a > 0):
+        return 0, np.ones(len(bounds), dtype=bool)
+
+    crossed = h1 <= h2
+    slope = (T[2] - top[2])/dh
+    with np.errstate(invalid="ignore", over="ignore"):
+        chord1, chord2 = top[2] + slope*h1, top[2] + slope*h2
+        if np.any(crossed & (bounds[:, 2] <= 0) & (np.minimum(chord1, chord2) <= bounds[:, 5])):
+            return -1, None
+
+        lowest = a*np.cosh((np.clip(h0, h1, h2) - h0)/a) + c + top[2]
+        meets = crossed & (lowest <= bounds[:, 5]) & (np.maximum(chord1, chord2) >= bounds[:, 2])
+
+    return 0, meets
+
+
 def cat_rectangle_collision(oi, xyzs):
 
     # plane_number: 10 point_number: 10 t_first_step: 140.73789429664612 dij_time: 1.1343741416931152
@@ -137,6 +670,22 @@ def collision(X_cat, cat, is_reversed, vertices, coord):
 
 
             
+def points_boxes_collision(xyzs, bounds):
+    '''
+    Which of the (N, 6) boxes [xmin, ymin, zmin, xmax, ymax, zmax] hold any of the (n, 3) points, (N,) booleans
+    '''
+    inside = (xyzs[None] >= bounds[:, None, :3]) & (xyzs[None] <= bounds[:, None, 3:])
+    return np.any(np.all(inside, axis=-1), axis=1)
+
+
+def first_box_hit(xyzs, bounds):
+    '''
+    Index of the first of the (N, 6) boxes holding any of the (n, 3) points, -1 if none does
+    '''
+    hits = points_boxes_collision(xyzs, bounds)
+    return int(np.argmax(hits)) if np.any(hits) else -1
+
+
 def cat_rectangle_collision2(oi, xyzs):
 
     # plane_number: 10 point_number: 10 t_first_step: 140.73789429664612 dij_time: 1.1343741416931152
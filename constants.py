@@ -11,4 +11,7 @@ HTOP = MARSUPIAL_HEIGHT-UAV_RADIUS
 
 EPSILON = 10**-6
 
-MAX_ITERS = 10**6
\ No newline at end of file
+MAX_ITERS = 10**6
+
+# .npy table written by build_catenary_table.py, None solves every catenary at plan time
+CATENARY_TABLE = None
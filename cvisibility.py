@@ -1,4 +1,5 @@
 import math
+import multiprocessing
 import numpy as np
 
 from cat2 import *
@@ -7,19 +8,18 @@ from tools import *
 from planners import *
 
 
-def get_cvisible_tops(T, g_obs, a_obs, p, q, k_length):
-    
+def get_cvisible_tops(T, g_obs, a_obs, p, q, k_length, length_tol=None, resolution=None, exact=False, scenario=None, angles=None, sampling=None, workers=None):
+    '''
+    With 'workers' > 1 the planes are processed in parallel by that many processes (see map_planes)
+    '''
     T_proj = np.array([T[0], T[1], HTOP])
     cradius = get_top_circ_radious(T)
 
-    vplanes, tt = get_vertical_planes(T, T_proj, cradius, p, g_obs, a_obs)
+    vplanes, tt = get_vertical_planes(T, T_proj, cradius, p, g_obs, a_obs, scenario, angles)
 
     tops3D = {}
-    for vp in vplanes:
-        tops = get_take_off_points(cradius, vp, q)
-        # CHECKPOINT #  plot_vertical_plane(vp,T,tops) 
-
-        cvis_tops, ti = get_cvisible_tops2D(vp, tops, T, k_length)
+    # CHECKPOINT #  plot_vertical_plane(vp,T,tops) 
+    for cvis_tops, ti in map_planes(get_cvisible_plane, vplanes, workers, cradius, q, T, k_length, length_tol, resolution, exact, sampling):
         tt += ti
 
         if cvis_tops != None:
@@ -30,58 +30,233 @@ def get_cvisible_tops(T, g_obs, a_obs, p, q, k_length):
     return tops3D, tt
 
 
-def get_tops_bf(T, g_obs, a_obs, p, q, k_length):
-    
+def get_refined_cvisible_tops(S, T, g_obs, a_obs, p, q, k_length, tol, coarse_p=8, n_best=2, length_tol=None, resolution=None, exact=False, scenario=None, visibility=None, sampling=None, workers=None):
+    '''
+    get_cvisible_tops over the angles of p planes, starting from the coarse_p evenly spaced ones. Each plane is scored 
+    by its best ground distance from S + tether length, and the planes halfway to the neighbours of the n_best 
+    planes are added until that cost improves less than 'tol' or the spacing reaches pi/p.
+
+    The planes of each round are processed together, in parallel with 'workers' > 1 (see map_planes)
+
+    Returns the tops of every plane built, the time to discount and the ground visibility used for the scores
+    '''
+    T_proj = np.array([T[0], T[1], HTOP])
+    cradius = get_top_circ_radious(T)
+    if scenario is None:
+        scenario = CompiledScenario(g_obs, a_obs)
+    if visibility is None:
+        visibility = {}
+
+    step = max(p // coarse_p, 1)
+    new = list(range(0, p, step))
+
+    tops3D, scores = {}, {}
+    tt, best = 0, None
+    while new:
+        vplanes, t = get_vertical_planes(T, T_proj, cradius, p, g_obs, a_obs, scenario, [math.pi/p*i for i in new])
+        tt += t
+        for i, (tops, t) in zip(new, map_planes(get_cvisible_plane, vplanes, workers, cradius, q, T, k_length, length_tol, resolution, exact, sampling)):
+            tops = tops or {}
+            tops3D.update(tops)
+
+            ground_points = {k[:2]: v for k, v in tops.items()}
+            Xopt, weights, _, t_error, visibility = upd_dijkstra_algorithm(S, ground_points, scenario.footprint_vertices, scenario.footprint_index, visibility, scenario.visibility_graph())
+            scores[i] = math.inf if Xopt is None else weights[Xopt]
+            tt += t + t_error
+
+        cost = min(scores.values())
+        if step == 1 or (best is not None and best - cost < tol):
+            break
+        best = cost
+
+        step = max(step // 2, 1)
+        ranked = sorted((i for i in scores if scores[i] < math.inf), key=scores.get)[:n_best]
+        new = sorted({(i + d) % p for i in ranked for d in (-step, step)} - scores.keys())
+
+    return tops3D, tt, visibility
+
+
+def get_cvisible_candidates(T, g_obs, a_obs, p, q, scenario=None, workers=None):
+    '''
+    (vertical plane, top, minL) of the tops of every plane that pass get_cvisible_candidates2D, still without catenary
+    '''
     T_proj = np.array([T[0], T[1], HTOP])
     cradius = get_top_circ_radious(T)
 
-    vplanes, tt = get_vertical_planes(T, T_proj, cradius, p, g_obs, a_obs)
+    vplanes, tt = get_vertical_planes(T, T_proj, cradius, p, g_obs, a_obs, scenario)
 
-    tops3D = {}
-    for vp in vplanes:
+    candidates = []
+    for vp, (cvis, t) in zip(vplanes, map_planes(get_cvisible_candidates_plane, vplanes, workers, cradius, q, T)):
         tops = get_take_off_points(cradius, vp, q)
-        
-        tops_cat = {}
-        for top in tops:
-            minL = euclidian_distance(top, T)
-            cat_points, length, t = get_min_catenary_rectangles(top, T, vp["ground_obstacles"]+vp["aerial_obstacles"], minL, TETHER_LENGTH, k_length, col2=True)
-            tt += t
-            # CHECKPOINT #  plot_3Dtether(top, T, cat_points, obstacles)
+        tt += t
+        if cvis is not None:
+            candidates += [(vp, tops[i], minL) for i, minL in cvis.items()]
 
-            if length > 0 and not math.isnan(cat_points[0][0]):
-                tops_cat[tuple(top)] = {"length": length, "tether": cat_points} 
-    
-            tops3D.update(tops_cat)
+    return candidates, tt
+
+
+def get_bounded_cvisible_tops(S, T, g_obs, a_obs, p, q, k_length, length_tol=None, resolution=None, exact=False, scenario=None, visibility=None, workers=None):
+    '''
+    get_cvisible_tops coupled with the ground distances from S (branch and bound). The c-visible tops are taken by
+    increasing lower bound, ground distance + straight tether to T, and only get a catenary while their bound is 
+    below the best ground distance + tether length so far. The returned tops hold the optimum of all of them.
+
+    Returns the tops, the time to discount and the ground visibility used
+    '''
+    if scenario is None:
+        scenario = CompiledScenario(g_obs, a_obs)
+    if visibility is None:
+        visibility = {}
+
+    candidates, tt = get_cvisible_candidates(T, g_obs, a_obs, p, q, scenario, workers)
+
+    # ground distances to the vertices of the ground graph, the ones to the tops are only found when needed
+    _, shortest_path, _, t, visibility = upd_dijkstra_algorithm(S, {}, scenario.footprint_vertices, scenario.footprint_index, visibility, scenario.visibility_graph())
+    tt += t
+
+    straight = lambda top: euclidian_distance_lists(S, top[:2]) + euclidian_distance(top, T)
+    candidates.sort(key=lambda c: straight(c[1]))
+
+    tops3D = {}
+    best = math.inf
+    for vp, top, minL in candidates:
+        if straight(top) >= best:
+            break
+
+        ground, _, t = ground_distance(tuple(top[:2]), shortest_path, scenario.footprint_index, visibility)
+        tt += t
+        if ground + euclidian_distance(top, T) >= best:
+            continue
+
+        cat_points, length, t = get_top_catenary(vp, top, T, minL, k_length, length_tol, resolution, exact)
+        tt += t
+        if length > 0 and not math.isnan(cat_points[0][0]):
+            tops3D[tuple(top)] = {"length": length, "tether": cat_points}
+            best = min(best, ground + length)
+
+    print("tops:", len(tops3D))
+
+    return tops3D, tt, visibility
+
+
+def get_tops_bf(T, g_obs, a_obs, p, q, k_length, length_tol=None, resolution=None, exact=False, scenario=None, workers=None):
+    '''
+    With 'workers' > 1 the planes are processed in parallel by that many processes (see map_planes)
+    '''
+    T_proj = np.array([T[0], T[1], HTOP])
+    cradius = get_top_circ_radious(T)
+
+    vplanes, tt = get_vertical_planes(T, T_proj, cradius, p, g_obs, a_obs, scenario)
+
+    tops3D = {}
+    for tops_cat, ti in map_planes(get_tops_bf_plane, vplanes, workers, cradius, q, T, k_length, length_tol, resolution, exact):
+        tt += ti
+        tops3D.update(tops_cat)
 
     print("tops:", len(tops3D))      
 
     return tops3D, tt
 
 
-def get_vertical_planes(T, T_proj, cradius, p, ground_obstacles, aerial_obstacles):
+def get_tops_bf_plane(vp, cradius, q, T, k_length, length_tol=None, resolution=None, exact=False):
+    '''
+    The tops of a plane with a collision free catenary, all of them checked
+    '''
+    tt = 0
+    tops_cat = {}
+    for top in get_take_off_points(cradius, vp, q):
+        minL = euclidian_distance(top, T)
+        cat_points, length, t = get_min_catenary_rectangles(top, T, vp["ground_obstacles"]+vp["aerial_obstacles"], minL, TETHER_LENGTH, k_length, col2=True, length_tol=length_tol, resolution=resolution, exact=exact, index=vp["index"])
+        tt += t
+        # CHECKPOINT #  plot_3Dtether(top, T, cat_points, obstacles)
+
+        if length > 0 and not math.isnan(cat_points[0][0]):
+            tops_cat[tuple(top)] = {"length": length, "tether": cat_points} 
+
+    return tops_cat, tt
+
+
+def get_cvisible_candidates_plane(vp, cradius, q, T):
+    '''
+    get_cvisible_candidates2D over the take-off points of a plane
+    '''
+    return get_cvisible_candidates2D(vp, get_take_off_points(cradius, vp, q), T)
 
+
+def get_cvisible_plane(vp, cradius, q, T, k_length, length_tol=None, resolution=None, exact=False, sampling=None):
+    '''
+    get_cvisible_tops2D over the take-off points of a plane
+    '''
+    return get_cvisible_tops2D(vp, get_take_off_points(cradius, vp, q), T, k_length, length_tol, resolution, exact, sampling)
+
+
+# planes and arguments of the map_planes call running in this process (a pool worker)
+_PLANE_TASK = None
+
+def _init_plane_worker(task):
+    global _PLANE_TASK
+    _PLANE_TASK = task
+
+def _run_plane_task(i):
+    fn, vplanes, args = _PLANE_TASK
+    return fn(vplanes[i], *args)
+
+
+def map_planes(fn, vplanes, workers=None, *args):
+    '''
+    [fn(vp, *args) for vp in vplanes], in a pool of 'workers' processes when there are more than one. The planes 
+    (with their obstacles) reach each worker once, when it starts, and the tasks only carry the plane's position
+    '''
+    if workers is None or workers <= 1 or len(vplanes) <= 1:
+        return [fn(vp, *args) for vp in vplanes]
+
+    with multiprocessing.Pool(min(workers, len(vplanes)), _init_plane_worker, ((fn, vplanes, args),)) as pool:
+        return pool.map(_run_plane_task, range(len(vplanes)))
+
+
+def get_vertical_planes(T, T_proj, cradius, p, ground_obstacles, aerial_obstacles, scenario=None, angles=None):
+    '''
+    One plane per angle in 'angles', by default the p evenly spaced angles in [0, pi).
+    The obstacles within reach of T are sliced with the hull edges of 'scenario' (a CompiledScenario), compiled here when not given.
+    Each plane keeps the 3-D cross-sections and, in "polygons", the same sections in the plane coords
+    '''
     Cx, Cy, _ = T_proj
     planes = []
 
-    for i in range(p):
-        border_point = np.array([math.cos(math.pi/p*i) + Cx, math.sin(math.pi/p*i) + Cy, HTOP])
+    if scenario is None:
+        scenario = CompiledScenario(ground_obstacles, aerial_obstacles)
+
+    # only the obstacles within reach of T, and among them the ones around each plane's angle, can be cut
+    reach = scenario.reach(T)
+    g_sectors = SectorIndex(reach.ground_index, T_proj, cradius)
+    a_sectors = SectorIndex(reach.aerial_index, T_proj, cradius)
+
+    if angles is None:
+        angles = [math.pi/p*i for i in range(p)]
+
+    for angle in angles:
+        border_point = np.array([math.cos(angle) + Cx, math.sin(angle) + Cy, HTOP])
         v = normalize(border_point - T_proj)
         Q = T_proj - v*cradius
         coords = get_plane_coords(Q, T) # find the best coordinates to represent the vertical plane (avoiding null coordinates problems)
-    
-        vplane_gobs, t1 = intersect_obstacles_and_vertical_plane(border_point, T, T_proj, ground_obstacles)
-        vplane_aobs, t2 = intersect_obstacles_and_vertical_plane(border_point, T, T_proj, aerial_obstacles)
+
+        g_edges = [reach.ground_edges[j] for j in g_sectors.query(angle)]
+        a_edges = [reach.aerial_edges[j] for j in a_sectors.query(angle)]
+        vplane_gobs, g_polygons = intersect_edges_and_vertical_plane(border_point, T, T_proj, g_edges, coords)
+        vplane_aobs, a_polygons = intersect_edges_and_vertical_plane(border_point, T, T_proj, a_edges, coords)
 
         planes.append({
             "Q": Q,
             "top_vector": v,
-            "angle": math.pi/p*i,
+            "angle": angle,
             "coords": coords,
             "ground_obstacles": vplane_gobs,
-            "aerial_obstacles": vplane_aobs
+            "aerial_obstacles": vplane_aobs,
+            "polygons": g_polygons + a_polygons,
+            "index": ObstacleIndex(vplane_gobs + vplane_aobs)
         })
     
-    return planes, t1+t2
+    return planes, 0
 
 
 def get_plane_coords(X, T):
@@ -95,23 +270,116 @@ def get_take_off_points(cradius, vertical_plane, q):
     step = 2*cradius/(q-1)
 
     return [Q + step*i*v for i in range(q)]
+
+
+class RayBisection:
+    '''
+    Sampling of the take-off points of a plane, which lie along one ray, for a UGV starting at S. Within each run of 
+    consecutive candidates, every 'step'-th point is evaluated, the feasibility boundaries between them are located 
+    by bisection, and each feasible interval is densified with 'dense' more points from its end closest to S, where 
+    its best candidates lie.
+    '''
+    def __init__(self, S, step=4, dense=2):
+        self.S = np.asarray(S, dtype=float)[:2]
+        self.step = step
+        self.dense = dense
+
+    def sample(self, tops, feasible, candidates=None):
+        '''
+        Indices of the tops evaluated with 'feasible(i)' (called once per index), among the 'candidates' 
+        (booleans, e.g. from a cheaper necessary test) or all of them
+        '''
+        if candidates is None:
+            candidates = [True]*len(tops)
+
+        known = {}
+        def is_feasible(i):
+            if i not in known:
+                known[i] = feasible(i)
+            return known[i]
+
+        for first, last in get_runs(range(len(tops)), candidates):
+            coarse = sorted(set(range(first, last + 1, self.step)) | {last})
+            is_feasible(first)
+            for a, b in zip(coarse, coarse[1:]):
+                while b - a > 1 and is_feasible(a) != is_feasible(b):
+                    m = (a + b)//2
+                    if is_feasible(m) == known[a]:
+                        a = m
+                    else:
+                        b = m
+
+        # feasible intervals: runs of feasible samples with no infeasible one in between
+        evaluated = sorted(known)
+        for first, last in get_runs(evaluated, [known[i] for i in evaluated]):
+            near = min((first, last), key=lambda i: euclidian_distance(tops[i][:2], self.S))
+            inward = 1 if near == first else -1
+            for j in range(1, self.dense + 1):
+                if first <= near + inward*j <= last:
+                    is_feasible(near + inward*j)
+
+        return sorted(known)
+
+
+def get_runs(indices, flags):
+    '''
+    (first, last) indices of every run of consecutive True flags
+    '''
+    runs, run = [], []
+    for i, flag in zip(indices, flags):
+        if flag:
+            run.append(i)
+        elif run:
+            runs.append((run[0], run[-1]))
+            run = []
+    if run:
+        runs.append((run[0], run[-1]))
+
+    return runs
         
 
-def get_cvisible_tops2D(vplane, tops, T, k_length):
+def get_cvisible_tops2D(vplane, tops, T, k_length, length_tol=None, resolution=None, exact=False, sampling=None):
+    '''
+    With a 'sampling' policy (e.g. RayBisection) only the tops it picks get a catenary
+    '''
+    candidates, tt = get_cvisible_candidates2D(vplane, tops, T)
+    if candidates is None:
+        return None, tt
+
+    tops_cat = {}
     
+    def evaluate(i):
+        nonlocal tt
+        if i in candidates:
+            top = tops[i]
+            cat_points, length, t = get_top_catenary(vplane, top, T, candidates[i], k_length, length_tol, resolution, exact)
+            tt += t
+
+            if length > 0 and not math.isnan(cat_points[0][0]):
+                tops_cat[tuple(top)] = {"length": length, "tether": cat_points} 
+                return True
+        return False
+
+    if sampling is None:
+        for i in range(len(tops)):
+            evaluate(i)
+    else:
+        sampling.sample(tops, evaluate, [i in candidates for i in range(len(tops))])
+            
+    return tops_cat, tt
+
+
+def get_cvisible_candidates2D(vplane, tops, T):
+    '''
+    Indices of the tops reaching T in the plane by a polygonal tether of length TETHER_LENGTH at most, with the 
+    length to start the catenary search from (None when the plane's visibility graph fails)
+    '''
     c0, c1 = vplane["coords"]
     T_proj = (T[c0], T[c1])
     tops_proj = [[np.array((top[c0], top[c1]))] for top in tops]
     
     tt = 0
-    obs_proj = []
-    obstacles = vplane["ground_obstacles"]+vplane["aerial_obstacles"]
-    for obs in obstacles:
-        obs = [np.array((vertex[c0], vertex[c1])) for vertex in obs]
-        t = time.time()
-        gch = ConvexHull(obs)
-        tt += time.time() - t
-        obs_proj.append(gch.points[gch.vertices])
+    obs_proj = vplane["polygons"]
 
     vertices_lists = [[T_proj]] + tops_proj + obs_proj
     try:
@@ -130,18 +398,22 @@ def get_cvisible_tops2D(vplane, tops, T, k_length):
 
     # CHECKPOINT # plot_polygonal_paths(weights, previous, [top[0] for top in tops_proj], T_proj, obs_proj)
 
-    tops_cat = {}
-    
-    for top in tops:
+    candidates = {}
+    for i, top in enumerate(tops):
         vtop = vg.Point(top[c0], top[c1]) 
         if vtop in weights:
-            minL = max(weights[vtop], euclidian_distance(top, T))
-            # cat_points, length, t = get_min_catenary(top, T, obstacles, minL, TETHER_LENGTH, k_length, k_collision)
-            cat_points, length, t = get_min_catenary_rectangles(top, T, obstacles, minL, TETHER_LENGTH, k_length)
-            tt += t
-            # CHECKPOINT #  plot_3Dtether(top, T, cat_points, obstacles)
+            candidates[i] = max(weights[vtop], euclidian_distance(top, T))
 
-            if length > 0 and not math.isnan(cat_points[0][0]):
-                tops_cat[tuple(top)] = {"length": length, "tether": cat_points} 
-            
-    return tops_cat, tt
\ No newline at end of file
+    return candidates, tt
+
+
+def get_top_catenary(vplane, top, T, minL, k_length, length_tol=None, resolution=None, exact=False):
+    '''
+    get_min_catenary_rectangles for a top of the plane, against the plane's obstacles
+    '''
+    obstacles = vplane["ground_obstacles"]+vplane["aerial_obstacles"]
+    # cat_points, length, t = get_min_catenary(top, T, obstacles, minL, TETHER_LENGTH, k_length, k_collision)
+    cat_points, length, t = get_min_catenary_rectangles(top, T, obstacles, minL, TETHER_LENGTH, k_length, length_tol=length_tol, resolution=resolution, exact=exact, index=vplane["index"])
+    # CHECKPOINT #  plot_3Dtether(top, T, cat_points, obstacles)
+
+    return cat_points, length, t
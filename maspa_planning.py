@@ -6,15 +6,55 @@ from drawing import *
 from tools import *
 
 
-def path_planning_smpp(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot=False, visibility=None):
+def path_planning_smpp(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot=False, visibility=None, length_tol=None, resolution=None, exact=False, scenario=None, refine_tol=None, sampling=None, bound=False, lazy=False, workers=None):
     """
         Planning algorithm based on Dijkstra apprach to reach B with the aerial vehicle starting from A with the ground vehicle
 
         The visibility graph can be partially pre-computed
+
+        With length_tol the minimum tether length of each take-off point is bisected to that tolerance
+        instead of being picked among k_length lengths, and a CatenaryResolution (e.g. 
+        CatenaryResolution.from_obstacles(ground_obs + aerial_obs)) replaces the fixed catenary sampling.
+        With exact catenaries are checked analytically against the obstacle boxes instead of by their points
+
+        'scenario' (a CompiledScenario of these obstacles) carries the preprocessing from one call to the next
+
+        With refine_tol only a few of the p planes are built, coarse first and then refined around the best 
+        ones until the cost improves less than refine_tol (see get_refined_cvisible_tops)
+
+        A 'sampling' policy (e.g. RayBisection(S)) evaluates only some of the q take-off points of each plane
+
+        With bound the take-off points whose ground distance + straight tether cannot beat the best solution 
+        found so far get no catenary (see get_bounded_cvisible_tops)
+
+        With lazy the catenaries are computed inside the ground Dijkstra, for the take-off points it reaches first
+        (see lazy_dijkstra_algorithm), and the search stops at the first one whose total cost is confirmed
+
+        With 'workers' > 1 the vertical planes are processed by a pool of that many processes
+
+        lazy, bound and refine_tol are different ways of building the take-off points and exclude each other,
+        and sampling only works with the plain and refine_tol ones: other combinations raise a ValueError
     """
+    if lazy + bound + (refine_tol is not None) > 1:
+        raise ValueError("lazy, bound and refine_tol cannot be combined")
+    if sampling is not None and (lazy or bound):
+        raise ValueError("sampling cannot be combined with lazy or bound")
+
+    if scenario is None:
+        scenario = CompiledScenario(ground_obs, aerial_obs)
+    # the static part of the ground visibility graph is built once per map, as the rest of the scenario
+    graph = scenario.visibility_graph()
+
     tt = 0
     t = time.time()
-    cvisible_tops, t_error = get_cvisible_tops(T, ground_obs, aerial_obs,  p, q, k_length)
+    if lazy:
+        candidates, t_error = get_cvisible_candidates(T, ground_obs, aerial_obs, p, q, scenario, workers)
+    elif bound:
+        cvisible_tops, t_error, visibility = get_bounded_cvisible_tops(S, T, ground_obs, aerial_obs, p, q, k_length, length_tol, resolution, exact, scenario, visibility, workers)
+    elif refine_tol is None:
+        cvisible_tops, t_error = get_cvisible_tops(T, ground_obs, aerial_obs,  p, q, k_length, length_tol, resolution, exact, scenario, sampling=sampling, workers=workers)
+    else:
+        cvisible_tops, t_error, visibility = get_refined_cvisible_tops(S, T, ground_obs, aerial_obs, p, q, k_length, refine_tol, length_tol=length_tol, resolution=resolution, exact=exact, scenario=scenario, visibility=visibility, sampling=sampling, workers=workers)
     tt += time.time()-t-t_error
     # print("cvisible_tops", tt, "t error", t_error)
 
@@ -39,10 +79,31 @@ def path_planning_smpp(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot
 
     ####################################################
 
-    ground_obs_proj, ground_obs_vertices = get_obstacles_proj_vertices(ground_obs)
-    ground_points = {k[:2]:v for k,v in cvisible_tops.items()}
     t = time.time()
-    Xopt, weigths, previous, t_error, visibility = upd_dijkstra_algorithm(S, ground_points, ground_obs_vertices, ground_obs_proj, visibility)
+    if lazy:
+        ground_points, t_cat = {}, 0
+        lazy_tops = {}
+        for vp, top, minL in candidates:
+            lazy_tops.setdefault(tuple(top[:2]), []).append((vp, top, minL))
+
+        def evaluate(X):
+            nonlocal t_cat
+            # a point of several planes takes the catenary of the last one that has it, as the tops of every 
+            # plane do below
+            for vp, top, minL in reversed(lazy_tops[X]):
+                cat_points, length, tc = get_top_catenary(vp, top, T, minL, k_length, length_tol, resolution, exact)
+                t_cat += tc
+                if length > 0 and not math.isnan(cat_points[0][0]):
+                    ground_points[X] = {"length": length, "tether": cat_points}
+                    return length
+
+        # the straight tether is the optimistic cost of each take-off point
+        estimates = {X: min(euclidian_distance(top, T) for _, top, _ in tops) for X, tops in lazy_tops.items()}
+        Xopt, weigths, previous, t_error, visibility = lazy_dijkstra_algorithm(S, estimates, scenario.footprint_vertices, scenario.footprint_index, evaluate, visibility, graph)
+        t_error += t_cat
+    else:
+        ground_points = {k[:2]:v for k,v in cvisible_tops.items()}
+        Xopt, weigths, previous, t_error, visibility = upd_dijkstra_algorithm(S, ground_points, scenario.footprint_vertices, scenario.footprint_index, visibility, graph)
     tt += time.time()-t-t_error
     # print("upd_dijkstra_algorithm", tt, "t error", t_error)
 
@@ -89,25 +150,37 @@ def path_planning_smpp(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot
     return ground_path, (min_ctop, min_ctop_d, min_ctop_d[min_ctop]["length"]), tt, visibility
     
 
-def path_planning_bf(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot=False, visibility=None):
+def path_planning_bf(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot=False, visibility=None, length_tol=None, resolution=None, exact=False, scenario=None, workers=None):
     """
         Planning algorithm based on Dijkstra apprach to reach B with the aerial vehicle starting from A with the ground vehicle
 
         The visibility graph can be partially pre-computed
+
+        With length_tol the minimum tether length of each take-off point is bisected to that tolerance
+        instead of being picked among k_length lengths, and a CatenaryResolution (e.g. 
+        CatenaryResolution.from_obstacles(ground_obs + aerial_obs)) replaces the fixed catenary sampling.
+        With exact catenaries are checked analytically against the obstacle boxes instead of by their points
+
+        'scenario' (a CompiledScenario of these obstacles) carries the preprocessing from one call to the next
+
+        With 'workers' > 1 the vertical planes are processed by a pool of that many processes
     """
+    if scenario is None:
+        scenario = CompiledScenario(ground_obs, aerial_obs)
+    graph = scenario.visibility_graph()
+
     tt = 0
     t = time.time()
-    tops, t_error = get_tops_bf(T, ground_obs, aerial_obs,  p, q, k_length)
+    tops, t_error = get_tops_bf(T, ground_obs, aerial_obs,  p, q, k_length, length_tol, resolution, exact, scenario, workers)
     tt += time.time()
     # print("cvisible_tops", tt, "t error", t_error)
 
     print(tt, t, t_error)
     tt-= (t+t_error)
 
-    ground_obs_proj, ground_obs_vertices = get_obstacles_proj_vertices(ground_obs)
     ground_points = {k[:2]:v for k,v in tops.items()}
     t = time.time()
-    Xopt, weigths, previous, t_error, visibility = upd_dijkstra_algorithm(S, ground_points, ground_obs_vertices, ground_obs_proj, visibility)
+    Xopt, weigths, previous, t_error, visibility = upd_dijkstra_algorithm(S, ground_points, scenario.footprint_vertices, scenario.footprint_index, visibility, graph)
     tt += time.time()-t-t_error
     # print("upd_dijkstra_algorithm", tt, "t error", t_error)
 
@@ -142,7 +215,7 @@ def path_planning_bf(S, T, ground_obs, aerial_obs, p=5, q=5, k_length=10, plot=F
     return ground_path, (min_ctop, min_ctop_d, min_ctop_d[min_ctop]["length"]), tt, visibility
 
 
-def maspa_sequential(plot=False, visibility=None):
+def maspa_sequential(plot=False):
     """
         MASPA for sequential targets
     """
@@ -159,14 +232,15 @@ def maspa_sequential(plot=False, visibility=None):
     p=16
     q=30
     k_length=26
+    scenario = CompiledScenario.from_dict(s)
     
     tt = 0
     gpaths = []
     opt_tops = []
     total_length = 0
     for i, T in enumerate(Ts):
-        # ground_path, opt_info, t, visibility = path_planning_smpp(S, T, ground_obs, aerial_obs, p=p, q=q, k_length=k_length, plot=plot, visibility=visibility)
-        ground_path, opt_info, t, visibility = path_planning_bf(S, T, ground_obs, aerial_obs, p=p, q=q, k_length=k_length, plot=plot, visibility=visibility)
+        # ground_path, opt_info, t, _ = path_planning_smpp(S, T, ground_obs, aerial_obs, p=p, q=q, k_length=k_length, plot=plot, scenario=scenario)
+        ground_path, opt_info, t, _ = path_planning_bf(S, T, ground_obs, aerial_obs, p=p, q=q, k_length=k_length, plot=plot, scenario=scenario)
         
         tt += t
         gpaths.append(ground_path)
@@ -225,12 +299,13 @@ def example():
     q=30
     
     k_length=26
+    scenario = CompiledScenario.from_dict(s)
     path_planning_smpp(
         s["S"], 
         s["T"], 
         s["ground_obstacles"],
         s["aerial_obstacles"], 
-        p, q, k_length, True)
+        p, q, k_length, True, scenario=scenario)
 
     print()
     print(s["S"])
@@ -240,7 +315,7 @@ def example():
         s["T"], 
         s["ground_obstacles"],
         s["aerial_obstacles"], 
-        p, q, k_length, True)
+        p, q, k_length, True, scenario=scenario)
 
 
 def run_random_experiments(n, init=0):
@@ -264,21 +339,21 @@ def run_random_experiments(n, init=0):
     for i in exps:
         si = s[i]
         r = {}
-        visibility = None
+        scenario = CompiledScenario.from_dict(si)
         for pi in p:    
             for qi in q:
                 print(pi, qi)
                 S = si["S"] + np.random.rand(3) # Avoid numerical errors
                 T = si["T"] + np.random.rand(3) # Avoid numerical errors
                 
-                gl, al, tt, visibility = path_planning_smpp(
+                gl, al, tt, _ = path_planning_smpp(
                     tuple(S), tuple(T), 
                     si["ground_obstacles"],
                     si["aerial_obstacles"], 
-                    pi, qi, k_length,plot=True,visibility=visibility)
+                    pi, qi, k_length,plot=True,scenario=scenario)
 
 
-                print("visibility", i, len(list(visibility.keys())))
+                print("visibility graph", i, len(scenario.visibility_graph()))
 
                 r[(pi,qi)] = {"gp_length": gl, "ap_length": al, "tt": tt, "scenario": i}
                 
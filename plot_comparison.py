@@ -18,6 +18,7 @@ from scipy.spatial import ConvexHull
 from maspa_planning import path_planning_smpp
 from run_benchmark import (RRT_star, Informed_RRT_star, Smart_RRT_star,
                             dijkstra, scenario_board_shape)
+from tools import CompiledScenario
 
 COLORS = {
     "MASPA":         "#2196F3",  # blue
@@ -28,17 +29,17 @@ COLORS = {
 
 # ── helpers ───────────────────────────────────────────────────────────────────
 
-def _run_rrt(algo_key, S, T, gobs, aobs, bshape, budget):
+def _run_rrt(algo_key, S, T, gobs, aobs, bshape, budget, scenario=None):
     with open(os.devnull, "w") as dn, contextlib.redirect_stdout(dn):
         if algo_key == "rrt":
             G = RRT_star(S[:2], T, gobs, aobs, 10**6, 26,
-                         n_iter=10**6, time_for_ending=budget, board_shape=bshape)
+                         n_iter=10**6, time_for_ending=budget, board_shape=bshape, scenario=scenario)
         elif algo_key == "informed":
             G = Informed_RRT_star(S[:2], T, gobs, aobs, 10**6, 26,
-                                  time_for_ending=budget, board_shape=bshape)
+                                  time_for_ending=budget, board_shape=bshape, scenario=scenario)
         else:
             G = Smart_RRT_star(S[:2], T, gobs, aobs, 10**6, 26,
-                               time_for_ending=budget, board_shape=bshape)
+                               time_for_ending=budget, board_shape=bshape, scenario=scenario)
     return G
 
 
@@ -68,11 +69,12 @@ def collect_single(sname, budget=40):
     S, T = sc["S"], sc["T"]
     gobs, aobs = sc["ground_obstacles"], sc["aerial_obstacles"]
     bshape = scenario_board_shape(sc)
+    scenario = CompiledScenario.from_dict(sc)
     methods = {}
 
     print(f"  [MASPA] ...", flush=True)
     with open(os.devnull, "w") as dn, contextlib.redirect_stdout(dn):
-        res = path_planning_smpp(S, T, gobs, aobs, p=16, q=30, k_length=26)
+        res = path_planning_smpp(S, T, gobs, aobs, p=16, q=30, k_length=26, scenario=scenario)
     if res[0] is not None:
         gpath, (anchor3d, ctop_d, _), _, _ = res
         methods["MASPA"] = {"ground_path": gpath,
@@ -80,7 +82,7 @@ def collect_single(sname, budget=40):
 
     for aname, akey in RRT_DEFS:
         print(f"  [{aname}] {budget}s ...", flush=True)
-        G = _run_rrt(akey, S, T, gobs, aobs, bshape, budget)
+        G = _run_rrt(akey, S, T, gobs, aobs, bshape, budget, scenario)
         gpath, tether = _extract_rrt(G, T)
         if gpath is not None:
             methods[aname] = {"ground_path": gpath, "tether": tether}
@@ -107,17 +109,18 @@ def collect_sequential(sname, budget_per_target=20):
     Ts     = sc["T"]
     gobs, aobs = sc["ground_obstacles"], sc["aerial_obstacles"]
     bshape = scenario_board_shape(sc)
+    scenario = CompiledScenario.from_dict(sc)
     methods = {}
 
     print(f"  [MASPA] {len(Ts)} targets ...", flush=True)
-    S_cur, vis, segs = S_init, None, []
+    S_cur, segs = S_init, []
     for T in Ts:
         with open(os.devnull, "w") as dn, contextlib.redirect_stdout(dn):
             res = path_planning_smpp(S_cur, T, gobs, aobs,
-                                     p=16, q=30, k_length=26, visibility=vis)
+                                     p=16, q=30, k_length=26, scenario=scenario)
         if res[0] is None:
             break
-        gpath, (anchor3d, ctop_d, _), _, vis = res
+        gpath, (anchor3d, ctop_d, _), _, _ = res
         segs.append({"ground_path": gpath, "tether": ctop_d[anchor3d]["tether"]})
         S_cur = tuple([*anchor3d[:2], 0])
     if segs:
@@ -127,7 +130,7 @@ def collect_sequential(sname, budget_per_target=20):
         print(f"  [{aname}] {budget_per_target}s × {len(Ts)} ...", flush=True)
         S_cur, segs = S_init, []
         for T in Ts:
-            G = _run_rrt(akey, S_cur, T, gobs, aobs, bshape, budget_per_target)
+            G = _run_rrt(akey, S_cur, T, gobs, aobs, bshape, budget_per_target, scenario)
             gpath, tether = _extract_rrt(G, T)
             if gpath is None:
                 break
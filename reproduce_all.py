@@ -29,6 +29,7 @@ else:
 
 print("\n==> Running MASPA and MASPA-BF on S2 ...")
 from maspa_planning import path_planning_smpp, path_planning_bf
+from tools import CompiledScenario
 
 with open("scenarios/S2.pkl", "rb") as f:
     s2 = pkl.load(f)
@@ -36,14 +37,15 @@ with open("scenarios/S2.pkl", "rb") as f:
 S, T = s2["S"], s2["T"]
 gobs, aobs = s2["ground_obstacles"], s2["aerial_obstacles"]
 p, q, k = 16, 30, 26
+s2_compiled = CompiledScenario.from_dict(s2)
 
 print("  [MASPA-SMPP]", flush=True)
 with contextlib.redirect_stdout(sys.stdout):
-    path_planning_smpp(S, T, gobs, aobs, p, q, k, plot=False)
+    path_planning_smpp(S, T, gobs, aobs, p, q, k, plot=False, scenario=s2_compiled)
 
 print("  [MASPA-BF]", flush=True)
 with contextlib.redirect_stdout(sys.stdout):
-    path_planning_bf(S, T, gobs, aobs, p, q, k, plot=False)
+    path_planning_bf(S, T, gobs, aobs, p, q, k, plot=False, scenario=s2_compiled)
 
 # ── 3. MASPA sequential on S3 ────────────────────────────────────────────────
 
@@ -98,8 +98,10 @@ class Graph:
                     new_edges.append((node, random_point))
 
             items = sorted(zip(distances, new_edges), key=lambda x: x[0])
-            for d, new_edge in items:
-                if is_visible(*new_edge, obstacles):
+            # the visibility of every candidate parent in one go, 'obstacles' being the EdgeIndex of the footprints
+            visible = obstacles.visible_segments([e[0] for _, e in items], [e[1] for _, e in items])
+            for (d, new_edge), isvis in zip(items, visible):
+                if isvis:
 
                     node_parent, new_node = new_edge
                     parentidx = self.get_id(node_parent)
@@ -143,15 +145,17 @@ def _connect_from_point(G, pt, obstacles, radius):
         if d <= radius:
             idx = G.get_id(node)
             candidates.append((d + G.distances[idx], node, pt))
-    for _, node_parent, new_node in sorted(candidates, key=lambda x: x[0]):
-        if is_visible(node_parent, new_node, obstacles):
+    candidates = sorted(candidates, key=lambda x: x[0])
+    visible = obstacles.visible_segments([c[1] for c in candidates], [c[2] for c in candidates])
+    for (_, node_parent, new_node), isvis in zip(candidates, visible):
+        if isvis:
             parentidx = G.get_id(node_parent)
             newidx = G.add_vex(new_node)
             return euclidian_distance(new_node, node_parent), newidx, parentidx
     return None
 
 
-def RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length, n_iter=2*10**3, time_for_ending=200, G=None, board_shape=None):
+def RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length, n_iter=2*10**3, time_for_ending=200, G=None, board_shape=None, length_tol=None, resolution=None, exact=False, scenario=None):
     ''' RRT star algorithm '''
     if board_shape is None:
         board_shape = BOARD_SHAPE
@@ -161,7 +165,10 @@ def RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length, n_iter=2*10*
     if G == None:
         G = Graph(startpos, endpos)
 
-    gobs_4planning = [[v[:2] for v in oi if v[-1]==0] for oi in ground_obs]
+    if scenario is None:
+        scenario = CompiledScenario(ground_obs, aerial_obs)
+    gobs_4planning = scenario.footprint_index
+    reach = scenario.reach(T)
 
     feasible_dist = math.sqrt(TETHER_LENGTH**2 - (T[-1] - MARSUPIAL_HEIGHT + UAV_RADIUS)**2)
     init_t = time.time()
@@ -184,9 +191,9 @@ def RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length, n_iter=2*10*
             top = [*newvex, MARSUPIAL_HEIGHT - UAV_RADIUS]
             cat, length, t = get_min_catenary_rectangles(
                 np.array(top), T,
-                ground_obs + aerial_obs,
+                reach.index.obstacles,
                 euclidian_distance_lists(top, G.endpos),
-                TETHER_LENGTH, k_length, col2=True)
+                TETHER_LENGTH, k_length, col2=True, length_tol=length_tol, resolution=resolution, exact=exact, index=reach.index)
 
             if length>0:
 
@@ -258,7 +265,7 @@ def dijkstra(G, endnode):
 
 
 def Informed_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
-                      time_for_ending=60, board_shape=None):
+                      time_for_ending=60, board_shape=None, length_tol=None, resolution=None, exact=False, scenario=None):
     """Informed RRT*: once a solution exists, restricts sampling to the prolate
     hyperellipsoid defined by (startpos, T[:2], c_best), ignoring regions that
     cannot improve the current best path (Gammell et al., IROS 2014)."""
@@ -266,7 +273,10 @@ def Informed_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
         board_shape = BOARD_SHAPE
     endpos = T[:2]
     G = Graph(startpos, endpos)
-    gobs_4planning = [[v[:2] for v in oi if v[-1] == 0] for oi in ground_obs]
+    if scenario is None:
+        scenario = CompiledScenario(ground_obs, aerial_obs)
+    gobs_4planning = scenario.footprint_index
+    reach = scenario.reach(T)
     feasible_dist = math.sqrt(TETHER_LENGTH ** 2 - (T[-1] - MARSUPIAL_HEIGHT + UAV_RADIUS) ** 2)
     init_t = time.time()
     G._init_time = init_t
@@ -296,9 +306,9 @@ def Informed_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
             top = [*newvex, MARSUPIAL_HEIGHT - UAV_RADIUS]
             cat, length, t = get_min_catenary_rectangles(
                 np.array(top), T,
-                ground_obs + aerial_obs,
+                reach.index.obstacles,
                 euclidian_distance_lists(top, G.endpos),
-                TETHER_LENGTH, k_length, col2=True)
+                TETHER_LENGTH, k_length, col2=True, length_tol=length_tol, resolution=resolution, exact=exact, index=reach.index)
 
             if length > 0:
                 endidx = G.add_vex(G.endpos)
@@ -319,7 +329,7 @@ def Informed_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
 
 
 def Smart_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
-                   time_for_ending=60, board_shape=None, p_smart=0.3):
+                   time_for_ending=60, board_shape=None, p_smart=0.3, length_tol=None, resolution=None, exact=False, scenario=None):
     """Smart RRT* (RRT*-Smart, Nasir et al. 2013): path-biased sampling near
     the current best ground-path waypoints after a solution is found, causing
     the tree to refine the path from within rather than exploring blindly."""
@@ -327,7 +337,10 @@ def Smart_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
         board_shape = BOARD_SHAPE
     endpos = T[:2]
     G = Graph(startpos, endpos)
-    gobs_4planning = [[v[:2] for v in oi if v[-1] == 0] for oi in ground_obs]
+    if scenario is None:
+        scenario = CompiledScenario(ground_obs, aerial_obs)
+    gobs_4planning = scenario.footprint_index
+    reach = scenario.reach(T)
     feasible_dist = math.sqrt(TETHER_LENGTH ** 2 - (T[-1] - MARSUPIAL_HEIGHT + UAV_RADIUS) ** 2)
     init_t = time.time()
     G._init_time = init_t
@@ -356,9 +369,9 @@ def Smart_RRT_star(startpos, T, ground_obs, aerial_obs, radius, k_length,
             top = [*newvex, MARSUPIAL_HEIGHT - UAV_RADIUS]
             cat, length, t = get_min_catenary_rectangles(
                 np.array(top), T,
-                ground_obs + aerial_obs,
+                reach.index.obstacles,
                 euclidian_distance_lists(top, G.endpos),
-                TETHER_LENGTH, k_length, col2=True)
+                TETHER_LENGTH, k_length, col2=True, length_tol=length_tol, resolution=resolution, exact=exact, index=reach.index)
 
             if length > 0:
                 endidx = G.add_vex(G.endpos)
@@ -439,6 +452,8 @@ def rrt_sequential(plotting=False):
     k_length=26
     radius = 10**6
 
+    scenario = CompiledScenario.from_dict(s)
+
     tt = 0
     gpaths = []
     opt_tops = []
@@ -446,7 +461,7 @@ def rrt_sequential(plotting=False):
     for i, T in enumerate(Ts):
 
         t = time.time()
-        G = RRT_star(S[:2],T,ground_obs,aerial_obs, radius, k_length, n_iter=10**6, time_for_ending=20)
+        G = RRT_star(S[:2],T,ground_obs,aerial_obs, radius, k_length, n_iter=10**6, time_for_ending=20, scenario=scenario)
         tt += time.time() - t
 
         ground_path, gpath_length = dijkstra(G, T)
@@ -504,7 +519,8 @@ def example():
     k_length = 26
 
     tt = time.time()
-    G = RRT_star(S[:2], T, g_obs, a_obs, radius, k_length, n_iter=10**6, time_for_ending=20)
+    G = RRT_star(S[:2], T, g_obs, a_obs, radius, k_length, n_iter=10**6, time_for_ending=20,
+                 scenario=CompiledScenario.from_dict(scenario))
     # print("time for graph", time.time()-tt)
 
     if G.success:
@@ -564,29 +580,29 @@ def run_benchmark(n_runs=30):
                     best = (cost, aerial)
         return best
 
-    def _call(algo_key, startpos, T, ground_obs, aerial_obs, time_budget, board_shape):
+    def _call(algo_key, startpos, T, ground_obs, aerial_obs, time_budget, board_shape, scenario):
         if algo_key == "rrt":
             G = RRT_star(startpos[:2], T, ground_obs, aerial_obs,
                          radius, k_length, n_iter=10**6, time_for_ending=time_budget,
-                         board_shape=board_shape)
+                         board_shape=board_shape, scenario=scenario)
         elif algo_key == "informed":
             G = Informed_RRT_star(startpos[:2], T, ground_obs, aerial_obs,
                                   radius, k_length, time_for_ending=time_budget,
-                                  board_shape=board_shape)
+                                  board_shape=board_shape, scenario=scenario)
         else:
             G = Smart_RRT_star(startpos[:2], T, ground_obs, aerial_obs,
                                radius, k_length, time_for_ending=time_budget,
-                               board_shape=board_shape)
+                               board_shape=board_shape, scenario=scenario)
         return G
 
-    def run_single(algo_key, data, time_budget, board_shape):
+    def run_single(algo_key, data, time_budget, board_shape, scenario):
         with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
             G = _call(algo_key, data["S"], data["T"],
                       data["ground_obstacles"], data["aerial_obstacles"],
-                      time_budget, board_shape)
+                      time_budget, board_shape, scenario)
         return G._improve_log
 
-    def run_sequential(algo_key, data, time_per_target, board_shape):
+    def run_sequential(algo_key, data, time_per_target, board_shape, scenario):
         """Run two sequential targets; returns a global improve_log with cumulative costs."""
         targets    = data["T"]
         ground_obs = data["ground_obstacles"]
@@ -599,7 +615,7 @@ def run_benchmark(n_runs=30):
         for i, T in enumerate(targets):
             is_last = (i == len(targets) - 1)
             with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
-                G = _call(algo_key, S_cur, T, ground_obs, aerial_obs, time_per_target, board_shape)
+                G = _call(algo_key, S_cur, T, ground_obs, aerial_obs, time_per_target, board_shape, scenario)
 
             # Return trip only for non-last targets (drone comes back to UGV)
             for (lt, lc, ll) in G._improve_log:
@@ -640,6 +656,7 @@ def run_benchmark(n_runs=30):
         n_targets     = len(data["T"]) if is_sequential else 1
         time_per_t    = TOTAL_TIME // n_targets   # 40s single, 20s each for S3
         bshape        = scenario_board_shape(data)
+        scenario      = CompiledScenario.from_dict(data)   # preprocessed once for every run
 
         for aname, akey in algo_defs:
             print(f"[{sname}] {aname} — {N_RUNS} runs × {TOTAL_TIME}s "
@@ -651,9 +668,9 @@ def run_benchmark(n_runs=30):
             for run_i in range(N_RUNS):
                 print(f"  run {run_i+1:2d}/{N_RUNS}", end="\r", flush=True)
                 if is_sequential:
-                    log = run_sequential(akey, data, time_per_t, bshape)
+                    log = run_sequential(akey, data, time_per_t, bshape, scenario)
                 else:
-                    log = run_single(akey, data, TOTAL_TIME, bshape)
+                    log = run_single(akey, data, TOTAL_TIME, bshape, scenario)
 
                 for t in TIME_CHECKPOINTS:
                     run_costs[t].append(best_cost_at(log, t))
@@ -0,0 +1,157 @@
+import math
+
+import numpy as np
+
+from cat2 import *
+
+
+def random_tops(n, seed=11):
+    '''
+    (it, top, T, obstacles) of random tops under 1 to 5 boxes, half of them on the ground
+    '''
+    rng = np.random.default_rng(seed)
+    for it in range(n):
+        top = np.array([*rng.uniform(0, 30, 2), 2.0])
+        T = np.array([*rng.uniform(0, 30, 2), rng.uniform(5, 30)])
+        if np.linalg.norm(T - top) > 48:
+            continue
+        obstacles = []
+        for _ in range(rng.integers(1, 6)):
+            x, y = rng.uniform(0, 30, 2)
+            w, h = rng.uniform(0.5, 6, 2)
+            z0 = 0. if rng.random() < .5 else rng.uniform(1, 20)
+            z1 = z0 + rng.uniform(0.5, 10)
+            obstacles.append([np.array([x+dx, y+dy, z]) for z in (z0, z1) for dx in (0, w) for dy in (0, h)])
+        yield it, top, T, obstacles
+
+
+def linear_scan(top, T, obstacles, exact, k_length=26):
+    '''
+    The first collision free length of the scan checked against every obstacle, without the envelope
+    '''
+    boxes = get_obstacles_bounds(obstacles)
+    f = T - top
+    dh = math.sqrt(f[0]**2 + f[1]**2)
+    Lmin = math.sqrt(dh**2 + f[2]**2)
+    lengths = np.linspace(Lmin + EPSILON, TETHER_LENGTH - EPSILON, k_length)
+    for l, xyzs in zip(lengths, CATENARY_CACHE.get_shapes(top, T, lengths)):
+        if exact:
+            _, status, _ = check_catenary_exact(xyzs, top, T, catenary_arc(dh, f[2], l), boxes)
+        else:
+            _, status, _ = check_catenary(xyzs, top, T, obstacles, False, boxes)
+        if status == 1:
+            return l
+        if status == -1:
+            return -1
+    return -1
+
+
+def test_envelope_keeps_the_scan_results():
+    seen = set()
+    for it, top, T, obstacles in random_tops(400):
+        for exact in (False, True):
+            _, length, _ = get_min_catenary_rectangles(top, T, obstacles, 0, TETHER_LENGTH, 26, exact=exact)
+            expected = linear_scan(top, T, obstacles, exact)
+            assert (length > 0) == (expected > 0), (it, exact)
+            if expected > 0:
+                assert abs(length - expected) < 1e-9, (it, exact)
+        seen.add(it)
+    assert 331 in seen
+
+
+def test_colliding_sampled_length_stays_discarded():
+    # the envelope dropped box 2 and gave this top a 23.87 length through it
+    it, top, T, obstacles = next(x for x in random_tops(332) if x[0] == 331)
+    assert np.allclose(top, [23.30, 5.45, 2], atol=0.01) and np.allclose(T, [17.28, 20.09, 14.73], atol=0.01)
+    _, length, _ = get_min_catenary_rectangles(top, T, obstacles, 0, TETHER_LENGTH, 26)
+    assert length == -1
+
+
+def test_ground_box_over_the_chord_discards_the_top():
+    top, T = np.array([0., 0., 2.]), np.array([20., 0., 10.])
+    wall = [np.array([x, y, z]) for z in (0., 20.) for x in (8., 10.) for y in (-1., 1.)]
+    boxes = get_obstacles_bounds([wall])
+    sweep, _ = catenary_envelope(top, T, catenary_arc(20., 8., TETHER_LENGTH - EPSILON), boxes)
+    assert sweep == -1
+    for exact in (False, True):
+        xyzs, length, _ = get_min_catenary_rectangles(top, T, [wall], 0, TETHER_LENGTH, 26, exact=exact)
+        assert xyzs is None and length == -1
+
+
+def feasibility(stretches, discard=()):
+    '''
+    get_shapes and check for bisect_min_catenary on lengths that are collision free inside 'stretches' and
+    discard the top inside 'discard', with the probed lengths recorded
+    '''
+    probed = []
+    get_shapes = lambda lengths: [np.zeros((2, 3)) for _ in lengths]
+    def check(l, xyzs):
+        probed.append(l)
+        if any(a <= l <= b for a, b in discard):
+            return xyzs, -1, 0
+        return xyzs, 1 if any(a <= l <= b for a, b in stretches) else 0, 0
+    return get_shapes, check, probed
+
+
+def test_bisection_on_monotone_feasibility():
+    get_shapes, check, probed = feasibility([(2.7, 4)])
+    _, length, _ = bisect_min_catenary(1, 4, None, 0.01, get_shapes, check)
+    assert 2.7 <= length < 2.71 and len(probed) < 20
+
+
+def test_bisection_falls_back_to_the_scan():
+    # a collision free stretch below a colliding one: the re-check at 1.75 finds it
+    get_shapes, check, _ = feasibility([(1.6, 1.9), (3, 4)])
+    _, length, _ = bisect_min_catenary(1, 4, None, 0.01, get_shapes, check)
+    assert 1.6 <= length < 1.61
+
+    # a length in between discards the top
+    get_shapes, check, _ = feasibility([(2, 4)], discard=[(2.4, 2.6)])
+    _, length, _ = bisect_min_catenary(1, 4, None, 0.01, get_shapes, check)
+    assert 2 <= length < 2.01
+
+    # nothing better in the bracket: the scan keeps its end
+    get_shapes, check, _ = feasibility([(4, 4)], discard=[(2.4, 2.6)])
+    xyzs, length, _ = bisect_min_catenary(1, 4, "end", 0.01, get_shapes, check)
+    assert (xyzs, length) == ("end", 4)
+
+
+# catenaries v = a*cosh((h - h0)/a) + c from the top (0, 0) to T (dh, dz), with their length
+KNOWN_CATENARIES = [
+    # symmetric, a = 1 between h = -1 and 1: length 2 sinh(1), sag cosh(1) - 1
+    (2., 0., 2*math.sinh(1), (1., 1., -math.cosh(1))),
+    # from the vertex of a = 2 up to h = 3
+    (3., 2*math.cosh(1.5) - 2, 2*math.sinh(1.5), (0., 2., -2.)),
+    # the same curve walked down from h = 3 to its vertex
+    (3., 2 - 2*math.cosh(1.5), 2*math.sinh(1.5), (3., 2., -2*math.cosh(1.5))),
+    # both ends on the same side of the vertex, a = 5 from h = 1 to 9
+    (8., 5*math.cosh(1.8) - 5*math.cosh(0.2), 5*(math.sinh(1.8) - math.sinh(0.2)), (-1., 5., -5*math.cosh(0.2))),
+]
+
+
+def test_catenary_arcs_match_known_solutions():
+    for dh, dz, L, expected in KNOWN_CATENARIES:
+        arcs = np.array(catenary_arcs(dh, dz, [L]))[:, 0]
+        assert np.allclose(arcs, expected, atol=1e-9), (dh, dz)
+        assert np.allclose(catenary_arc(dh, dz, L), expected, atol=1e-9), (dh, dz)
+
+
+def test_catenary_profiles_match_known_solutions():
+    for dh, dz, L, (h0, a, c) in KNOWN_CATENARIES:
+        profile = catenary_profiles(dh, dz, [L], n_points=50)[0]
+        h, v = profile[:, 0], profile[:, 1]
+        # from the top to T, on the curve, evenly spaced along it
+        assert np.allclose(profile[0], [0, 0], atol=1e-9) and np.allclose(profile[-1], [dh, dz], atol=1e-9)
+        assert np.allclose(v, a*np.cosh((h - h0)/a) + c, atol=1e-9)
+        arc = a*np.sinh((h - h0)/a)
+        assert np.allclose(np.diff(arc), L/49, atol=1e-9)
+
+
+def test_catenary_shapes_place_the_profile():
+    top, T = np.array([1., 2., 3.]), np.array([1. + 1.8, 2. + 2.4, 3. + 2*math.cosh(1.5) - 2])
+    shape = catenary_shapes(top, T, [2*math.sinh(1.5)])[0]
+    h = np.hypot(shape[:, 0], shape[:, 1])
+    assert np.allclose(shape[0], 0, atol=1e-9) and np.allclose(shape[-1], T - top, atol=1e-9)
+    assert np.allclose(shape[:, 2], 2*np.cosh(h/2) - 2, atol=1e-9)
+    # in the vertical plane of top and T
+    assert np.allclose(shape[1:, 1]/shape[1:, 0], 2.4/1.8)
@@ -0,0 +1,15 @@
+import os
+import pickle as pkl
+
+from conftest import ROOT
+from cvisibility import get_cvisible_tops
+
+
+def test_s3_cvisible_tops():
+    '''
+    The plane sections keep their corners: a tolerance in the hull order dropped real ones (S3 had 110 and 113 tops)
+    '''
+    with open(os.path.join(ROOT, "scenarios", "S3.pkl"), "rb") as f:
+        s = pkl.load(f)
+    counts = [len(get_cvisible_tops(T, s["ground_obstacles"], s["aerial_obstacles"], 16, 30, 26)[0]) for T in s["T"]]
+    assert counts == [107, 110]
@@ -0,0 +1,103 @@
+import os
+import pickle as pkl
+import random
+import sys
+
+import numpy as np
+
+from conftest import ROOT
+from tools import *
+
+
+def random_goals(rng):
+    costs = {}
+    for _ in range(rng.randint(1, 12)):
+        costs[(rng.uniform(-40, 40), rng.uniform(-40, 40))] = rng.uniform(0, 30)
+    # optimistic estimates, never above the cost
+    estimates = {X: c*rng.uniform(0, 1) for X, c in costs.items()}
+    return costs, estimates
+
+
+def test_lazy_dijkstra_matches_upd_dijkstra():
+    with open(os.path.join(ROOT, "scenarios", "random_scenarios.pkl"), "rb") as f:
+        scenarios = pkl.load(f)
+
+    rng = random.Random(0)
+    for si in scenarios[:200]:
+        scenario = CompiledScenario.from_dict(si)
+        S = tuple(map(float, si["S"][:2]))
+        costs, estimates = random_goals(rng)
+
+        Xopt, weights, _, _, _ = upd_dijkstra_algorithm(S, {X: {"length": c} for X, c in costs.items()},
+                                                        scenario.footprint_vertices, scenario.footprint_index)
+        Xlazy, weights_lazy, _, _, _ = lazy_dijkstra_algorithm(S, estimates, scenario.footprint_vertices, 
+                                                               scenario.footprint_index, costs.get)
+
+        # upd_dijkstra_algorithm gives an unreachable goal when there is nothing better, lazy gives None
+        if Xopt is not None and weights[Xopt] == sys.maxsize:
+            Xopt = None
+        assert Xlazy == Xopt
+        if Xopt is not None:
+            assert abs(weights_lazy[Xlazy] - weights[Xopt]) < 1e-9
+
+
+def linear_dijkstra(start_node, goals, other_vertices, visible):
+    '''
+    upd_dijkstra_algorithm as it was on a list: the next node is the first minimum of a linear scan
+    '''
+    unvisited_nodes = [start_node] + list(goals.keys()) + [v for vlist in other_vertices for v in vlist]
+    shortest_path = dict.fromkeys(unvisited_nodes, sys.maxsize)
+    shortest_path[start_node] = 0
+    previous_nodes = {start_node: None}
+
+    while unvisited_nodes:
+        current = unvisited_nodes[0]
+        for node in unvisited_nodes[1:]:
+            if shortest_path[node] < shortest_path[current]:
+                current = node
+
+        if current in goals:
+            return current, shortest_path, previous_nodes
+
+        unvisited_nodes.remove(current)
+        for node in unvisited_nodes:
+            if visible(current, node):
+                dist = euclidian_distance_lists(current, node) + shortest_path[current]
+                if node in goals:
+                    dist += goals[node]["length"]
+                if dist < shortest_path[node]:
+                    shortest_path[node] = dist
+                    previous_nodes[node] = current
+
+        if len(previous_nodes) == 1:
+            break
+
+    return None, shortest_path, previous_nodes
+
+
+def test_upd_dijkstra_matches_linear_scan():
+    rng = random.Random(1)
+    for name in ("S2", "S5"):
+        with open(os.path.join(ROOT, "scenarios", f"{name}.pkl"), "rb") as f:
+            scenario = CompiledScenario.from_dict(pkl.load(f))
+        index = scenario.footprint_index
+        vertices = [v for vlist in scenario.footprint_vertices for v in vlist]
+        (x0, y0), (x1, y1) = np.min(vertices, axis=0), np.max(vertices, axis=0)
+        inside = tuple(np.mean(scenario.footprint_vertices[0], axis=0))
+
+        for k in range(30):
+            S = (rng.uniform(x0, x1), rng.uniform(y0, y1))
+            goals = {(rng.uniform(x0, x1), rng.uniform(y0, y1)): {"length": rng.uniform(0, 20)} for _ in range(rng.randint(1, 6))}
+            # two goals at the same cost in opposite directions: the first in list order wins the tie
+            d = rng.uniform(0.1, 1)
+            goals[(S[0] + d, S[1])] = goals[(S[0] - d, S[1])] = {"length": rng.uniform(0, 5)}
+            if k % 3 == 0:
+                # only a goal inside a footprint: nothing reaches it and the scan returns it anyway
+                goals = {inside: {"length": 1.0}}
+            if k % 10 == 0:
+                S = inside
+
+            expected = linear_dijkstra(S, goals, scenario.footprint_vertices, index.is_visible)
+            for graph in (None, scenario.visibility_graph()):
+                Xopt, shortest_path, previous_nodes, _, _ = upd_dijkstra_algorithm(S, goals, scenario.footprint_vertices, index, None, graph)
+                assert (Xopt, shortest_path, previous_nodes) == expected, (name, k, graph is not None)
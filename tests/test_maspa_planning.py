@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+
+from maspa_planning import path_planning_smpp
+
+
+@pytest.mark.parametrize("options", [
+    {"lazy": True, "bound": True},
+    {"bound": True, "refine_tol": 0.5},
+    {"lazy": True, "refine_tol": 0.5},
+    {"bound": True, "sampling": object()},
+    {"lazy": True, "sampling": object()},
+])
+def test_incompatible_options(options):
+    with pytest.raises(ValueError):
+        path_planning_smpp((0, 0, 0), (10, 10, 10), [], [], **options)
+
+
+@pytest.mark.parametrize("lengths, expected", [({"A": 10., "B": 20.}, 20.), ({"A": 10., "B": -1}, 10.)])
+def test_lazy_point_shared_by_planes(monkeypatch, tmp_path, lengths, expected):
+    # the same take-off point in two planes: as with the tops of every plane, the last one with a catenary gives it
+    import maspa_planning
+    # the planner saves its solution under scenarios/
+    (tmp_path / "scenarios").mkdir()
+    monkeypatch.chdir(tmp_path)
+    top = np.array([5., 0., 2.])
+    monkeypatch.setattr(maspa_planning, "get_cvisible_candidates", lambda *args: ([("A", top, 1.), ("B", top, 1.)], 0))
+    monkeypatch.setattr(maspa_planning, "get_top_catenary",
+                        lambda vp, *args: (np.zeros((2, 3)), lengths[vp], 0) if lengths[vp] > 0 else (None, -1, 0))
+    ground_path, (_, _, length), _, _ = path_planning_smpp((0., 0., 0.), (10., 0., 10.), [], [], lazy=True)
+    assert length == expected
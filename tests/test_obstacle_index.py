@@ -0,0 +1,40 @@
+import random
+
+import numpy as np
+
+from tools import *
+
+
+def brute_force(bounds, lo, hi):
+    return np.flatnonzero(np.all(bounds[:, :3] <= hi, axis=1) & np.all(bounds[:, 3:] >= lo, axis=1))
+
+
+def flat_box(x, y, z0, z1, w=0., h=0.):
+    return [np.array([x + dx, y + dy, z]) for z in (z0, z1) for dx in (0, w) for dy in (0, h)]
+
+
+def test_obstacle_index_over_flat_boxes():
+    rng = random.Random(6)
+    for _ in range(50):
+        # a plane cut through box edges gives boxes with no x and y side: vertical segments, some of them repeated
+        obstacles = [flat_box(rng.randint(0, 40), rng.randint(0, 40), 0, rng.uniform(1, 10)) for _ in range(rng.randint(1, 30))]
+        obstacles += [flat_box(rng.uniform(0, 40), rng.uniform(0, 40), rng.uniform(0, 5), rng.uniform(6, 10), rng.choice([0., 3.]), 0.)
+                      for _ in range(rng.randint(0, 10))]
+        index = ObstacleIndex(obstacles)
+        assert index.shape.max() <= 257
+
+        for _ in range(30):
+            lo = np.array([rng.uniform(-5, 45), rng.uniform(-5, 45), rng.uniform(0, 10)])
+            hi = lo + np.array([rng.choice([0., rng.uniform(0, 20)]), rng.choice([0., rng.uniform(0, 20)]), rng.uniform(0, 10)])
+            assert index.query(lo, hi).tolist() == brute_force(index.bounds, lo, hi).tolist()
+
+        # the query boxes of the obstacles themselves, touching them on a side
+        for b in index.bounds:
+            assert index.query(b[:3], b[3:]).tolist() == brute_force(index.bounds, b[:3], b[3:]).tolist()
+
+
+def test_obstacle_index_over_a_single_segment():
+    index = ObstacleIndex([flat_box(3., 4., 0., 2.)])
+    assert index.cell >= EPSILON and index.shape.tolist() == [1, 1]
+    assert index.query(np.array([3., 4., 1.]), np.array([3., 4., 1.])).tolist() == [0]
+    assert index.query(np.array([3.1, 4., 1.]), np.array([5., 5., 1.])).tolist() == []
@@ -0,0 +1,120 @@
+import itertools
+import os
+import pickle as pkl
+import random
+
+import numpy as np
+
+from conftest import ROOT
+from tools import *
+
+
+def test_segments_intersect_matches_do_intersect():
+    # on a small integer grid most pairs are collinear, share an endpoint or touch one
+    points = [np.array(p, dtype=float) for p in itertools.product(range(4), repeat=2)]
+    segments = list(itertools.combinations(points, 2))
+    p1, q1 = np.array([s[0] for s in segments]), np.array([s[1] for s in segments])
+
+    for p2, q2 in segments:
+        got = segments_intersect(p1, q1, p2, q2)
+        assert got.tolist() == [do_intersect(a, b, p2, q2) for a, b in segments]
+
+
+def test_collinear_and_touching_segments():
+    assert segments_intersect(np.array([0., 0.]), np.array([2., 0.]), np.array([1., 0.]), np.array([3., 0.]))
+    assert not segments_intersect(np.array([0., 0.]), np.array([1., 0.]), np.array([2., 0.]), np.array([3., 0.]))
+    # an endpoint on the other segment, and a shared endpoint, both count as crossing
+    assert segments_intersect(np.array([0., 0.]), np.array([2., 0.]), np.array([1., 0.]), np.array([1., 5.]))
+    assert segments_intersect(np.array([0., 0.]), np.array([2., 0.]), np.array([2., 0.]), np.array([4., 3.]))
+
+
+def test_visible_segments_matches_do_intersect_from_outside():
+    rng = random.Random(2)
+    square = [(2., 2.), (4., 2.), (4., 4.), (2., 4.)]
+    edges = get_footprint_edges([square])
+    pairs = [(square[i], square[j]) for i in range(4) for j in range(i+1, 4)]
+    for _ in range(2000):
+        P1 = (rng.choice([rng.uniform(0, 6), rng.randint(0, 6)]), rng.choice([rng.uniform(0, 6), rng.randint(0, 6)]))
+        P2 = (rng.choice([rng.uniform(0, 6), rng.randint(0, 6)]), rng.choice([rng.uniform(0, 6), rng.randint(0, 6)]))
+        if all(2 < c < 4 for c in P1):
+            continue
+        assert visible_segments(P1, P2, edges) == (not any(do_intersect(a, b, P1, P2) for a, b in pairs)), (P1, P2)
+
+
+def test_segment_inside_a_footprint_is_visible():
+    # the diagonals are not sides: a segment with both ends inside crosses no edge
+    square = [(2., 2.), (4., 2.), (4., 4.), (2., 4.)]
+    assert is_visible((2.5, 3.5), (3.5, 2.5), [square])
+    assert not is_visible((1, 3), (3, 3), [square])
+
+
+def random_edges(rng, n, span=10):
+    return np.array([[(rng.randint(0, span), rng.randint(0, span)), (rng.randint(0, span), rng.randint(0, span))] for _ in range(n)], dtype=float)
+
+
+def test_sweep_visible_matches_visible_segments():
+    rng = random.Random(3)
+    for _ in range(300):
+        # integer coordinates put targets and edge ends on the -pi/pi cut, on the point and on the edges' lines
+        edges = random_edges(rng, rng.randint(1, 12))
+        point = np.array([rng.randint(0, 10), rng.randint(0, 10)], dtype=float)
+        targets = np.array([(rng.randint(0, 10), rng.randint(0, 10)) for _ in range(rng.randint(1, 20))], dtype=float)
+        assert sweep_visible(point, targets, edges).tolist() == visible_segments(point, targets, edges).tolist()
+
+
+def test_sweep_visible_special_directions():
+    point = np.array([5., 5.])
+    edges = np.array([
+        [(2., 4.), (2., 6.)],     # across the -pi/pi cut
+        [(4., 5.), (6., 5.)],     # through the point
+        [(5., 5.), (5., 8.)],     # from the point
+        [(7., 2.), (7., 3.)],
+    ])
+    targets = np.array([(0., 5.), (1., 5.0000001), (1., 4.9999999), (5., 5.), (5., 9.), (9., 5.), (8., 2.5), (9., 9.), (5., 0.)])
+    expected = visible_segments(point, targets, edges)
+    assert sweep_visible(point, targets, edges).tolist() == expected.tolist()
+    assert not expected[0] and not expected[1] and not expected[2] and not expected[3]
+
+
+def test_sweep_visible_on_the_scenarios():
+    rng = random.Random(4)
+    for name in ("S2", "S5"):
+        with open(os.path.join(ROOT, "scenarios", f"{name}.pkl"), "rb") as f:
+            scenario = CompiledScenario.from_dict(pkl.load(f))
+        edges = scenario.footprint_edges
+        targets = np.array([v for vlist in scenario.footprint_vertices for v in vlist])
+        # from the graph's own vertices, on edges' lines, and from random points
+        (x0, y0), (x1, y1) = targets.min(axis=0), targets.max(axis=0)
+        points = list(targets[:: max(len(targets)//20, 1)]) + [(e[0] + e[1])/2 for e in edges[:10]]
+        points += [(rng.uniform(x0, x1), rng.uniform(y0, y1)) for _ in range(20)]
+        for point in points:
+            assert sweep_visible(point, targets, edges).tolist() == visible_segments(point, targets, edges).tolist()
+
+
+def test_edge_index_matches_visible_segments():
+    rng = random.Random(5)
+    for _ in range(200):
+        edges = random_edges(rng, rng.randint(1, 30))
+        for cell in (None, 1., 2.):
+            # integer ends on a grid of integer cells: the segments run along cell sides and through cell corners
+            index = EdgeIndex(edges, cell)
+            P1 = np.array([(rng.randint(-1, 11), rng.randint(-1, 11)) for _ in range(20)], dtype=float)
+            P2 = np.array([(rng.randint(-1, 11), rng.randint(-1, 11)) for _ in range(20)], dtype=float)
+            expected = visible_segments(P1, P2, edges).tolist()
+            assert [index.is_visible(p, q) for p, q in zip(P1, P2)] == expected
+            assert index.visible_segments(P1, P2).tolist() == expected
+            assert index.sweep_visible(P1[0], P2).tolist() == visible_segments(P1[0], P2, edges).tolist()
+
+
+def test_segment_cells_through_corners():
+    index = EdgeIndex(np.array([[(0., 0.), (10., 10.)]]), 1.)
+    o = index.origin
+    # a diagonal through the corners gives both cells beside each of them
+    cells = list(index.segment_cells(o + (0.5, 0.5), o + (3.5, 3.5)))
+    assert cells == [(0, 0), (1, 0), (0, 1), (1, 1), (2, 1), (1, 2), (2, 2), (3, 2), (2, 3), (3, 3)]
+    # an edge beside the diagonal that touches it at a corner blocks it
+    corner = o + (2, 2)
+    edges = np.array([[(0., 0.), (0., 0.)], [(10., 10.), (10., 10.)], [corner, corner + (0.5, -0.5)]])
+    side = EdgeIndex(edges, 1.)
+    assert not visible_segments(corner - (0.5, 0.5), corner + (0.5, 0.5), edges)
+    assert not side.is_visible(corner - (0.5, 0.5), corner + (0.5, 0.5))
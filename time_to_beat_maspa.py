@@ -13,6 +13,7 @@ import contextlib, os, pickle as pkl
 from run_benchmark import (RRT_star, Informed_RRT_star, Smart_RRT_star,
                            dijkstra, scenario_board_shape)
 from path_lengths import ground_length, tether_length
+from tools import CompiledScenario
 
 MAX_TIME  = 600    # 1 minute
 T1_BUDGET = 20    # seconds for T1 in sequential (always solved well within this)
@@ -22,17 +23,17 @@ radius    = 10**6
 RRT_DEFS = [("RRT*", "rrt"), ("Informed RRT*", "informed"), ("Smart RRT*", "smart")]
 
 
-def _run(algo_key, S, T, gobs, aobs, bshape, budget):
+def _run(algo_key, S, T, gobs, aobs, bshape, budget, scenario=None):
     with open(os.devnull, "w") as dn, contextlib.redirect_stdout(dn):
         if algo_key == "rrt":
             G = RRT_star(S[:2], T, gobs, aobs, radius, k_length,
-                         n_iter=10**6, time_for_ending=budget, board_shape=bshape)
+                         n_iter=10**6, time_for_ending=budget, board_shape=bshape, scenario=scenario)
         elif algo_key == "informed":
             G = Informed_RRT_star(S[:2], T, gobs, aobs, radius, k_length,
-                                  time_for_ending=budget, board_shape=bshape)
+                                  time_for_ending=budget, board_shape=bshape, scenario=scenario)
         else:
             G = Smart_RRT_star(S[:2], T, gobs, aobs, radius, k_length,
-                               time_for_ending=budget, board_shape=bshape)
+                               time_for_ending=budget, board_shape=bshape, scenario=scenario)
     return G
 
 
@@ -58,13 +59,13 @@ def _maspa_ref(pd):
         return ground_length(md["ground_path"]) + tether_length(md["tether"])
 
 
-def beat_single(algo_key, S, T, gobs, aobs, bshape, maspa_ref):
-    G = _run(algo_key, S, T, gobs, aobs, bshape, MAX_TIME)
+def beat_single(algo_key, S, T, gobs, aobs, bshape, maspa_ref, scenario=None):
+    G = _run(algo_key, S, T, gobs, aobs, bshape, MAX_TIME, scenario)
     return _first_beat(G._improve_log, maspa_ref)
 
 
-def beat_sequential(algo_key, S_init, Ts, gobs, aobs, bshape, maspa_ref):
-    G1 = _run(algo_key, S_init, Ts[0], gobs, aobs, bshape, T1_BUDGET)
+def beat_sequential(algo_key, S_init, Ts, gobs, aobs, bshape, maspa_ref, scenario=None):
+    G1 = _run(algo_key, S_init, Ts[0], gobs, aobs, bshape, T1_BUDGET, scenario)
     if not G1.success or not G1._improve_log:
         return None
 
@@ -74,7 +75,7 @@ def beat_sequential(algo_key, S_init, Ts, gobs, aobs, bshape, maspa_ref):
     gpath, _ = dijkstra(G1, Ts[0])
     S_cur = tuple([*gpath[-1][:2], 0])
 
-    G2 = _run(algo_key, S_cur, Ts[1], gobs, aobs, bshape, MAX_TIME - T1_BUDGET)
+    G2 = _run(algo_key, S_cur, Ts[1], gobs, aobs, bshape, MAX_TIME - T1_BUDGET, scenario)
 
     for (lt, lc, _) in G2._improve_log:
         if cost_offset + lc < maspa_ref:
@@ -112,6 +113,7 @@ for sname, sequential in SCENARIOS:
     gobs = sc["ground_obstacles"]
     aobs = sc["aerial_obstacles"]
     bshape = scenario_board_shape(sc)
+    scenario = CompiledScenario.from_dict(sc)
 
     print(f"\n  {sname}  —  MASPA cost: {maspa_ref:.2f}")
     print(f"  {'-'*44}")
@@ -119,9 +121,9 @@ for sname, sequential in SCENARIOS:
     for aname, akey in RRT_DEFS:
         print(f"    {aname:<16}  running...", end="\r", flush=True)
         if sequential:
-            t = beat_sequential(akey, S, T, gobs, aobs, bshape, maspa_ref)
+            t = beat_sequential(akey, S, T, gobs, aobs, bshape, maspa_ref, scenario)
         else:
-            t = beat_single(akey, S, T, gobs, aobs, bshape, maspa_ref)
+            t = beat_single(akey, S, T, gobs, aobs, bshape, maspa_ref, scenario)
 
         if t is not None:
             result = f"beat MASPA at  {t:6.1f} s"
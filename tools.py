@@ -5,10 +5,11 @@ import pyvisgraph as vg
 import sys
 import time
 
+from collections import OrderedDict
+from heapq import heappop, heappush
 from constants import *
 from numpy.linalg import lstsq
 from scipy.spatial import ConvexHull
-from trimesh import intersections as tint
 
 
 def normalize(v):
@@ -42,43 +43,397 @@ def get_top_circ_radious(T,):
     return math.sqrt(l**2 - (T[-1]-h+r)**2)
 
 
-def intersect_obstacles_and_vertical_plane(p1, p2, p3, obstacles):
+def intersect_obstacles_and_vertical_plane(p1, p2, p3, obstacles, cache=None):
 
+    cache = HULL_CACHE if cache is None else cache
+
+    t = time.time()
+    obstacles_edges = [cache.get_hull(oi)[1] for oi in obstacles]
+    tt = time.time() - t
+
+    vertical_obstacles, _ = intersect_edges_and_vertical_plane(p1, p2, p3, obstacles_edges)
+
+    return vertical_obstacles, tt
+
+
+def intersect_edges_and_vertical_plane(p1, p2, p3, obstacles_edges, coords=(0, 2)):
+    '''
+    intersect_obstacles_and_vertical_plane for obstacles given by their (E, 2, 3) hull edges (see CompiledScenario).
+    All the edges are cut at once; returns the 3-D points of every non empty cross-section and its
+    polygon in the plane 'coords', ordered counterclockwise
+    '''
     v1 = p2-p1
     v2 = p3-p1
     normal_vector = normalize(np.cross(v1, v2))
 
-    tt = 0
-    vertical_obstacles = []
-    for oi in obstacles:
-
-        t = time.time()
-        hull = hull = ConvexHull(oi)
-        tt += time.time() - t
-        
-        edges = []
-        for simplex in hull.simplices:
-            s = hull.points[simplex]
-            edges += [(s[i], s[i+1]) for i in range(len(s)-1)] + [(s[-1], s[0])]
+    if not len(obstacles_edges):
+        return [], []
 
-        intersections = plane_edges_collision_points_normal(p1, normal_vector, edges)
-        intersections = set([tuple(i) for i in intersections])
+    edges = np.concatenate(obstacles_edges)
+    ids = np.repeat(np.arange(len(obstacles_edges)), [len(e) for e in obstacles_edges])
+    intersections, valid = plane_edges_collision_points_normal(p1, normal_vector, edges)
+    ids = ids[valid]
+
+    vertical_obstacles, polygons = [], []
+    for i in np.unique(ids):
 
-        if len(intersections):
-            vertical_obstacles.append(list(intersections))
+        section = list(dict.fromkeys(map(tuple, intersections[ids == i])))
+        points = np.array(section)[:, coords]
 
-    return vertical_obstacles, tt
+        vertical_obstacles.append(section)
+        polygons.append(points[convex_polygon_order(points)])
+
+    return vertical_obstacles, polygons
+
+
+def convex_polygon_order(points):
+    '''
+    Indices of the vertices of the convex hull of the 2-D points, counterclockwise and without
+    repeated or collinear points (Andrew's monotone chain)
+    '''
+    # snapped to EPSILON units the orientation test is exact: no tolerance to flatten real corners, and the
+    # points a rounding apart (the same plane cut of one edge) coincide
+    snapped = [tuple(int(v) for v in np.round(np.asarray(p, dtype=float)[:2]/EPSILON)) for p in points]
+    order = sorted(range(len(points)), key=lambda i: snapped[i])
+    if len(order) < 3:
+        return order
+
+    def turns_left(p, q, r):
+        return (q[0]-p[0])*(r[1]-q[1]) - (q[1]-p[1])*(r[0]-q[0]) > 0
+
+    def chain(indices):
+        hull = []
+        for i in indices:
+            while len(hull) >= 2 and not turns_left(snapped[hull[-2]], snapped[hull[-1]], snapped[i]):
+                hull.pop()
+            hull.append(i)
+        return hull[:-1]
+
+    return chain(order) + chain(reversed(order))
+
+
+def get_hull_edges(hull):
+    '''
+    (E, 2, 3) array with the edges of the hull facets, each once
+    '''
+    pairs = {}
+    for simplex in hull.simplices:
+        for i, j in zip(simplex, np.roll(simplex, -1)):
+            pairs.setdefault((min(i, j), max(i, j)), (i, j))
+
+    return hull.points[np.array(list(pairs.values()))]
+
+
+class HullCache:
+    '''
+    Bounded LRU memo of obstacle hulls, keyed by the obstacle vertices. The same obstacles are sliced
+    by every vertical plane of every target, so each hull is only built the first time it is seen.
+    '''
+    def __init__(self, maxsize=10**4):
+        self.maxsize = maxsize
+        self.hulls = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.hulls)
+
+    def clear(self):
+        self.hulls.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def get_hull(self, obstacle):
+        '''
+        (F, 3, 3) hull facets and (E, 2, 3) hull edges of the obstacle
+        '''
+        points = np.asarray(obstacle, dtype=float)
+        key = (points.shape, points.tobytes())
+
+        hull = self.hulls.get(key)
+        if hull is not None:
+            self.hits += 1
+            self.hulls.move_to_end(key)
+            return hull
+
+        self.misses += 1
+        ch = ConvexHull(points)
+        hull = self.hulls[key] = (ch.points[ch.simplices], get_hull_edges(ch))
+        if len(self.hulls) > self.maxsize:
+            self.hulls.popitem(last=False)
+
+        return hull
+
+
+HULL_CACHE = HullCache()
+
+
+def get_obstacles_bounds(obstacles):
+    '''
+    (N, 6) array with the [xmin, ymin, zmin, xmax, ymax, zmax] box of every (non empty) obstacle
+    '''
+    bounds = [np.concatenate([np.min(oi, axis=0), np.max(oi, axis=0)]) for oi in obstacles if len(oi)]
+    return np.array(bounds) if bounds else np.empty((0, 6))
+
+
+class ObstacleIndex:
+    '''
+    Uniform grid over the horizontal extent of the obstacle boxes, built once per obstacle set. query returns
+    the obstacles whose box overlaps a given box, in their original order (so the first hit stays the same).
+    Obstacles are vertical extrusions in all the scenarios, which is why the grid only splits x and y.
+    '''
+    def __init__(self, obstacles, cell=None):
+        self.obstacles = [oi for oi in obstacles if len(oi)]
+        self.bounds = get_obstacles_bounds(self.obstacles)
+        self.cells = {}
+
+        if not len(self.obstacles):
+            self.origin, self.cell, self.shape = np.zeros(2), 1., np.ones(2, dtype=int)
+            return
+
+        # at most 256 cells a side, boxes flat in x and y (a plane cut through a box edge) have no side to go by
+        sides = self.bounds[:, 3:5] - self.bounds[:, :2]
+        extent = float((self.bounds[:, 3:5].max(axis=0) - self.bounds[:, :2].min(axis=0)).max())
+        self.cell = cell if cell is not None else max(float(np.median(sides)), extent/256, EPSILON)
+        self.origin = self.bounds[:, :2].min(axis=0)
+        self.shape = np.floor((self.bounds[:, 3:5].max(axis=0) - self.origin)/self.cell).astype(int) + 1
+
+        for i, (lo, hi) in enumerate(zip(*self.cell_range(self.bounds[:, :2], self.bounds[:, 3:5]))):
+            for cx in range(lo[0], hi[0] + 1):
+                for cy in range(lo[1], hi[1] + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def __len__(self):
+        return len(self.obstacles)
+
+    def cell_range(self, lo, hi):
+        '''
+        First and last grid cells covered by the horizontal box [lo, hi], clipped to the grid
+        '''
+        first = np.clip(np.floor((np.asarray(lo) - self.origin)/self.cell), 0, self.shape - 1).astype(int)
+        last = np.clip(np.floor((np.asarray(hi) - self.origin)/self.cell), 0, self.shape - 1).astype(int)
+        return first, last
+
+    def query(self, lo, hi):
+        '''
+        Indices, in list order, of the obstacles whose box overlaps the box of corners lo and hi (x, y, z)
+        '''
+        if not len(self.obstacles):
+            return np.empty(0, dtype=int)
+
+        (x0, y0), (x1, y1) = self.cell_range(lo[:2], hi[:2])
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                found.update(self.cells.get((cx, cy), ()))
+
+        ids = np.array(sorted(found), dtype=int)
+        bounds = self.bounds[ids]
+        return ids[np.all(bounds[:, :3] <= hi, axis=1) & np.all(bounds[:, 3:] >= lo, axis=1)]
+
+    def candidates(self, lo, hi):
+        '''
+        Obstacles and (N, 6) bounds of query(lo, hi)
+        '''
+        ids = self.query(lo, hi)
+        return [self.obstacles[i] for i in ids], self.bounds[ids]
+
+
+class EdgeIndex:
+    '''
+    Uniform grid over the (E, 2, 2) footprint edges of a map (get_footprint_edges), built once per scenario. Each 
+    edge is listed in the cells of its box, padded so that rounding cannot drop an edge touching a cell side. 
+    Visibility queries only test the edges of the cells they reach, with the same answer as against all edges.
+    '''
+    def __init__(self, edges, cell=None, batch=32):
+        self.edges = np.asarray(edges, dtype=float).reshape(-1, 2, 2)
+        self.bounds = np.concatenate([self.edges.min(axis=1), self.edges.max(axis=1)], axis=1)
+        self.batch = batch
+        self.cells = {}
+
+        if not len(self.edges):
+            self.origin, self.cell, self.shape, self.pad = np.zeros(2), 1., np.ones(2, dtype=int), 0.
+            return
+
+        lengths = np.hypot(*(self.edges[:, 1] - self.edges[:, 0]).T)
+        self.cell = cell if cell is not None else max(float(np.median(lengths)), EPSILON)
+        self.pad = 1e-9 * (1 + np.abs(self.bounds).max())
+        self.origin = self.bounds[:, :2].min(axis=0) - self.pad
+        self.shape = np.floor((self.bounds[:, 2:].max(axis=0) + self.pad - self.origin)/self.cell).astype(int) + 1
+
+        for i, (lo, hi) in enumerate(zip(*self.cell_range(self.bounds[:, :2] - self.pad, self.bounds[:, 2:] + self.pad))):
+            for cx in range(lo[0], hi[0] + 1):
+                for cy in range(lo[1], hi[1] + 1):
+                    self.cells.setdefault((cx, cy), []).append(i)
+
+    def __len__(self):
+        return len(self.edges)
+
+    def cell_range(self, lo, hi):
+        '''
+        First and last grid cells covered by the box [lo, hi], clipped to the grid
+        '''
+        first = np.clip(np.floor((np.asarray(lo) - self.origin)/self.cell), 0, self.shape - 1).astype(int)
+        last = np.clip(np.floor((np.asarray(hi) - self.origin)/self.cell), 0, self.shape - 1).astype(int)
+        return first, last
+
+    def query(self, lo, hi):
+        '''
+        Indices, in list order, of the edges whose box overlaps the box of corners lo and hi (x, y)
+        '''
+        if not len(self.edges):
+            return np.empty(0, dtype=int)
+
+        (x0, y0), (x1, y1) = self.cell_range(lo[:2], hi[:2])
+        found = set()
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                found.update(self.cells.get((cx, cy), ()))
+
+        ids = np.array(sorted(found), dtype=int)
+        bounds = self.bounds[ids]
+        return ids[np.all(bounds[:, :2] <= np.asarray(hi[:2]) + self.pad, axis=1) & 
+                   np.all(bounds[:, 2:] >= np.asarray(lo[:2]) - self.pad, axis=1)]
+
+    def segment_cells(self, p, q):
+        '''
+        Grid cells crossed by the segment pq, walked from p to q (Amanatides and Woo); through a cell corner
+        both cells beside it are given
+        '''
+        a, b = (np.asarray(p[:2], dtype=float) - self.origin)/self.cell, (np.asarray(q[:2], dtype=float) - self.origin)/self.cell
+        (cx, cy), (ex, ey) = np.floor(a).astype(int), np.floor(b).astype(int)
+        dx, dy = b - a
+        sx, sy = (1 if dx > 0 else -1), (1 if dy > 0 else -1)
+        tx = (cx + (sx > 0) - a[0])/dx if dx else math.inf
+        ty = (cy + (sy > 0) - a[1])/dy if dy else math.inf
+        dtx, dty = (abs(1/dx) if dx else math.inf), (abs(1/dy) if dy else math.inf)
+
+        yield int(cx), int(cy)
+        while (cx, cy) != (ex, ey) and min(tx, ty) <= 1:
+            if tx < ty:
+                cx, tx = cx + sx, tx + dtx
+            elif ty < tx:
+                cy, ty = cy + sy, ty + dty
+            else:
+                yield int(cx + sx), int(cy)
+                yield int(cx), int(cy + sy)
+                cx, tx, cy, ty = cx + sx, tx + dtx, cy + sy, ty + dty
+            yield int(cx), int(cy)
+
+    def is_visible(self, p, q):
+        '''
+        is_visible against the edges of the cells crossed by pq, tested a batch at a time from p onwards
+        so that the walk stops at the first batch with a hit
+        '''
+        p, q = np.asarray(p, dtype=float)[:2], np.asarray(q, dtype=float)[:2]
+        seen, pending = set(), []
+        for cell in self.segment_cells(p, q):
+            for i in self.cells.get(cell, ()):
+                if i not in seen:
+                    seen.add(i)
+                    pending.append(i)
+
+            if len(pending) >= self.batch:
+                if segments_intersect(self.edges[pending, 0], self.edges[pending, 1], p, q).any():
+                    return False
+                pending = []
+
+        return not (pending and segments_intersect(self.edges[pending, 0], self.edges[pending, 1], p, q).any())
+
+    def near(self, points):
+        '''
+        Edges that the segments between the points can meet, those overlapping the box of the points
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return self.edges[self.query(points.min(axis=0), points.max(axis=0))]
+
+    def visible_segments(self, P1, P2):
+        '''
+        visible_segments against the edges in the box of the segments
+        '''
+        if not len(P1):
+            return np.ones(0, dtype=bool)
+
+        P1, P2 = np.asarray(P1, dtype=float)[..., :2], np.asarray(P2, dtype=float)[..., :2]
+        return visible_segments(P1, P2, self.near(np.concatenate([P1.reshape(-1, 2), P2.reshape(-1, 2)])))
+
+    def sweep_visible(self, point, targets):
+        '''
+        sweep_visible against the edges in the box of the point and the targets
+        '''
+        if not len(targets):
+            return np.ones(0, dtype=bool)
+
+        targets = np.asarray(targets, dtype=float).reshape(len(targets), -1)[:, :2]
+        return sweep_visible(point, targets, self.near(np.vstack([np.asarray(point, dtype=float)[:2], targets])))
+
+
+class SectorIndex:
+    '''
+    Angular interval spanned by the obstacles of an ObstacleIndex as seen from the vertical axis through 'center',
+    for the obstacles whose box meets the disk of 'radius' around it. Built once per target: a vertical plane through
+    the axis at a given angle only cuts the obstacles whose interval (taken modulo pi) contains that angle.
+    '''
+    def __init__(self, index, center, radius):
+        self.center = np.asarray(center, dtype=float)[:2]
+        self.radius = radius
+
+        lo, hi = np.append(self.center - radius, -np.inf), np.append(self.center + radius, np.inf)
+        ids = index.query(lo, hi)
+        bounds = index.bounds[ids]
+
+        # distance from the axis to each box, zero along the axes where the axis is within the box
+        gap = np.maximum(np.maximum(bounds[:, :2] - self.center, self.center - bounds[:, 3:5]), 0)
+        near = np.hypot(gap[:, 0], gap[:, 1]) <= radius + EPSILON
+        self.ids, bounds, gap = ids[near], bounds[near], gap[near]
+        self.start = np.zeros(len(self.ids))
+        self.width = np.full(len(self.ids), np.pi)
+
+        # obstacles around the axis are cut by every plane
+        outside = np.nonzero(np.any(gap > 0, axis=1))[0]
+        if not len(outside):
+            return
+
+        vertices = [np.asarray(index.obstacles[i])[:, :2] for i in self.ids[outside]]
+        sizes = [len(v) for v in vertices]
+        xy = np.concatenate(vertices) - self.center
+
+        # angles relative to the direction of the box center, within (-pi, pi) as the box does not hold the axis
+        mid = (bounds[outside, :2] + bounds[outside, 3:5])/2 - self.center
+        ref = np.arctan2(mid[:, 1], mid[:, 0])
+        rel = (np.arctan2(xy[:, 1], xy[:, 0]) - np.repeat(ref, sizes) + np.pi) % (2*np.pi) - np.pi
+
+        first = np.concatenate([[0], np.cumsum(sizes)[:-1]])
+        low, high = np.minimum.reduceat(rel, first), np.maximum.reduceat(rel, first)
+        self.start[outside] = ref + low - EPSILON
+        self.width[outside] = high - low + 2*EPSILON
+
+    def __len__(self):
+        return len(self.ids)
+
+    def query(self, angle):
+        '''
+        Indices, in list order, of the obstacles that a vertical plane through the axis at 'angle' may cut
+        '''
+        return self.ids[(angle - self.start) % np.pi <= self.width]
 
 
 def plane_edges_collision_points_normal(plane_point, normal, edges):
+    '''
+    Points where the (E, 2, 3) edges cross the plane and the (E,) mask of the edges that do. Edges
+    lying on the plane do not count, their ends are found on the neighbouring edges
+    '''
+    a, b = edges[:, 0], edges[:, 1]
+    direction = b - a
+    direction = direction / np.sqrt((direction*direction).sum(axis=1))[:, None]
 
-    intersections = []
-    for edge in edges:
-        inters, valid = tint.plane_lines(plane_point, normal, edge, line_segments=True)
-        if len(inters):
-            intersections.append(inters[0])
+    ta = (plane_point - a) @ normal
+    tb = (plane_point - b) @ normal
+    cos = direction @ normal
 
-    return intersections
+    valid = (np.abs(cos) > 1e-12) & (np.sign(ta) != np.sign(tb)) & ((np.abs(ta) > 1e-12) | (np.abs(tb) > 1e-12))
+
+    return a[valid] + (ta[valid]/cos[valid])[:, None]*direction[valid], valid
 
 
 def lineq(p1, p2):
@@ -92,95 +447,307 @@ def lineq(p1, p2):
 
 # Inspired on:
 # https://www.udacity.com/blog/2021/10/implementing-dijkstras-algorithm-in-python.html
-def upd_dijkstra_algorithm(start_node, goals, other_vertices, obstacles, visibility = None):
-
+def upd_dijkstra_algorithm(start_node, goals, other_vertices, obstacles, visibility = None, graph = None):
+    '''
+    Dijkstra from start_node over the goals and the other vertices, which stops at the first goal reached. 
+    A goal costs its ground distance plus goals[node]["length"]. Nodes are kept in a heap of (distance, id) 
+    with lazy deletion; the ids follow the node list, so ties come out in list order as in a linear scan.
+    With a GroundVisibilityIndex of the other vertices as 'graph' only the edges to S and the goals are checked
+    '''
     if visibility == None:
         visibility = {}
+    if not isinstance(obstacles, EdgeIndex):
+        obstacles = EdgeIndex(obstacles if isinstance(obstacles, np.ndarray) else get_footprint_edges(obstacles))
 
-    unvisited_nodes = [start_node] + list(goals.keys()) + [v for vlist in other_vertices for v in vlist ]
+    nodes = list(dict.fromkeys([start_node] + list(goals.keys()) + [v for vlist in other_vertices for v in vlist]))
+    ids = {node: i for i, node in enumerate(nodes)}
+    unvisited_nodes = dict.fromkeys(range(len(nodes)))
+
+    tt = 0
+    if graph is not None:
+        added = graph.add_nodes([start_node, *goals])
 
-    # We'll use this dict to save the cost of visiting each node and update it as we move along the graph   
-    shortest_path = {}
- 
-    # We'll use this dict to save the shortest known path to a node found so far
-    previous_nodes = {}
- 
     # We'll use max_value to initialize the "infinity" value of the unvisited nodes   
     max_value = sys.maxsize
 
-    for node in unvisited_nodes:
-        shortest_path[node] = max_value
-    
-    # However, we initialize the starting node's value with 0   
+    # We'll use this dict to save the cost of visiting each node and update it as we move along the graph   
+    shortest_path = dict.fromkeys(nodes, max_value)
     shortest_path[start_node] = 0
-    previous_nodes[start_node] = None
+ 
+    # We'll use this dict to save the shortest known path to a node found so far
+    previous_nodes = {start_node: None}
     
-    tt = 0
-    # The algorithm executes until we visit all nodes
-    while unvisited_nodes:
-        # The code block below finds the node with the lowest score
-        current = unvisited_nodes[0]
-        for i in range(1, len(unvisited_nodes)): # Iterate over the nodes
-            if shortest_path[unvisited_nodes[i]] < shortest_path[current]:
-                current = unvisited_nodes[i]
+    Xopt = None
+    queue = [(0, 0)]
+    while queue:
+        dist, i = heappop(queue)
+        current = nodes[i]
+        if i not in unvisited_nodes or dist > shortest_path[current]:
+            continue
 
         if current in goals:
-            return current, shortest_path, previous_nodes, tt, visibility
+            Xopt = current
+            break
         
-        unvisited_nodes.remove(current)
+        del unvisited_nodes[i]
 
-                
-        # The code block below retrieves the current node's neighbors and updates their distances
-        # neighbors = graph.get_outgoing_edges(current_min_node)                    
-        for node in unvisited_nodes:
+        if graph is None:
+            neighbours = unvisited_nodes
+        else:
+            neighbours = [ids[node] for node in graph.neighbours(current) if ids.get(node) in unvisited_nodes]
 
-            t = time.time()
-            if (current, node) in visibility: 
-                isvis = visibility[(current, node)]
-            else:
-                isvis = is_visible(current, node, obstacles) 
-                visibility[(current, node)] = isvis 
-            tt += time.time() - t
+        improving = []
+        for j in neighbours:
+            node = nodes[j]
 
-            if isvis:
-                dist = euclidian_distance_lists(current, node) + shortest_path[current]
+            dist = euclidian_distance_lists(current, node) + shortest_path[current]
+            ### This is for optimizing ground path length + flight path length                
+            if node in goals:
+                dist += goals[node]["length"]
 
-                ### This is for optimizing ground path length + flight path length                
-                if node in goals:
-                    dist += goals[node]["length"]
+            # visibility is only needed for the edges that would improve the node
+            if dist < shortest_path[node]:
+                improving.append((j, dist))
 
-                if dist < shortest_path[node]:
-                    
-                    shortest_path[node] = dist 
-                    previous_nodes[node] = current
+        t = time.time()
+        visible = check_visibility(current, [nodes[j] for j, _ in improving], obstacles, visibility, graph)
+        tt += time.time() - t
+
+        for (j, dist), isvis in zip(improving, visible):
+            if isvis:
+                node = nodes[j]
+                shortest_path[node] = dist 
+                previous_nodes[node] = current
+                heappush(queue, (dist, j))
 
         if len(previous_nodes) == 1:
             break
+    else:
+        # the nodes left cannot be reached, a scan in list order would still stop at the first goal among them
+        Xopt = next((nodes[j] for j in unvisited_nodes if nodes[j] in goals), None)
 
-    return None, shortest_path, previous_nodes, tt, visibility
+    if graph is not None:
+        graph.remove_nodes(added)
 
+    return Xopt, shortest_path, previous_nodes, tt, visibility
 
-# Given the numerical problems of pyvisgraph we must implement our own visibility
-def is_visible(P1, P2, obstacles):
-    
-    # import matplotlib.pyplot as plt
-    # plt.plot([P1[0], P2[0]], [P1[1], P2[1]], "ok")
-    for obs in obstacles:
-        
-        for i in range(len(obs)): 
-            for j in range(i+1, len(obs)): 
-        
-                # plt.plot([obs[i][0], obs[j][0]], [obs[i][1], obs[j][1]], "-k")
 
-                if do_intersect(obs[i], obs[j], P1, P2):
-                    # plt.title("False")
-                    # plt.show()
-                    return False
+def lazy_dijkstra_algorithm(start_node, goals, other_vertices, obstacles, evaluate, visibility = None, graph = None):
+    '''
+    upd_dijkstra_algorithm for goals whose cost is only known on demand: 'goals' maps each goal to an optimistic
+    estimate of its cost (never above it) and evaluate(goal) returns the cost, None for an infeasible goal. Goals
+    are queued by ground distance + estimate and evaluated when they come out first; the search ends on the first 
+    goal that comes out again with its cost, having evaluated only the goals that could beat it. A GroundVisibilityIndex
+    as 'graph' gives the visibility as in upd_dijkstra_algorithm
+    '''
+    if visibility == None:
+        visibility = {}
+    if not isinstance(obstacles, EdgeIndex):
+        obstacles = EdgeIndex(obstacles if isinstance(obstacles, np.ndarray) else get_footprint_edges(obstacles))
+
+    unvisited_nodes = dict.fromkeys([start_node] + list(goals.keys()) + [v for vlist in other_vertices for v in vlist])
+    position = {node: i for i, node in enumerate(unvisited_nodes)}
+
+    shortest_path = {start_node: 0}
+    previous_nodes = {start_node: None}
+    evaluated = set()
 
-    # plt.title("True")
-    # plt.show()
-    return True
+    tt = 0
+    if graph is not None:
+        added = graph.add_nodes([start_node, *goals])
 
+    Xopt = None
+    order = 0
+    queue = [(0, order, start_node)]
+    while queue:
+        key, _, current = heappop(queue)
+        if current not in unvisited_nodes:
+            continue
+
+        if current in goals:
+            if current in evaluated:
+                # entries queued before the cost was known come out first, only the one with the cost ends the search
+                if key < shortest_path[current]:
+                    continue
+                Xopt = current
+                break
+            if key > shortest_path[current] + goals[current]:
+                continue
+
+            # its ground distance is settled, the goal leaves the graph and comes back with its cost
+            cost = evaluate(current)
+            evaluated.add(current)
+            if cost is None:
+                del unvisited_nodes[current]
+            else:
+                shortest_path[current] += cost
+                order += 1
+                heappush(queue, (shortest_path[current], order, current))
+            continue
+
+        if key > shortest_path[current]:
+            continue
+        del unvisited_nodes[current]
+
+        if graph is None:
+            neighbours = unvisited_nodes
+        else:
+            neighbours = sorted((node for node in graph.neighbours(current) if node in unvisited_nodes), key=position.get)
+
+        improving = []
+        for node in neighbours:
+            # visibility is only needed for the edges that would improve the node
+            dist = euclidian_distance_lists(current, node) + shortest_path[current]
+            if node not in evaluated and dist < shortest_path.get(node, sys.maxsize):
+                improving.append((node, dist))
+
+        t = time.time()
+        visible = check_visibility(current, [node for node, _ in improving], obstacles, visibility, graph)
+        tt += time.time() - t
+
+        for (node, dist), isvis in zip(improving, visible):
+            if isvis:
+                shortest_path[node] = dist 
+                previous_nodes[node] = current
+                order += 1
+                heappush(queue, (dist + goals.get(node, 0), order, node))
+
+    if graph is not None:
+        graph.remove_nodes(added)
+
+    return Xopt, shortest_path, previous_nodes, tt, visibility
+
+
+def check_visibility(current, nodes, obstacles, visibility, graph=None):
+    '''
+    Visibility from 'current' to each of the nodes, for the neighbours of a node settled by the Dijkstras: from the
+    GroundVisibilityIndex if given, else from the visibility dict, the pairs missing being found in one sweep_visible
+    against the EdgeIndex 'obstacles'
+    '''
+    if graph is not None:
+        return graph.visible_from(current, nodes)
+
+    unknown = [node for node in nodes if (current, node) not in visibility]
+    for node, isvis in zip(unknown, obstacles.sweep_visible(current, unknown)):
+        visibility[(current, node)] = bool(isvis)
+
+    return [visibility[(current, node)] for node in nodes]
+
+
+def ground_distance(point, shortest_path, obstacles, visibility):
+    '''
+    Shortest ground distance to 'point', given the shortest_path to every vertex of the ground graph 
+    (upd_dijkstra_algorithm without goals), and the vertex it comes from. Vertices are tried by the 
+    length of the path through them, so the first visible one gives it
+    '''
+    tt = 0
+    order = sorted((d + euclidian_distance_lists(v, point), i, v) for i, (v, d) in enumerate(shortest_path.items()) if d < sys.maxsize)
+    for dist, _, v in order:
+        t = time.time()
+        if (v, point) not in visibility:
+            visibility[(v, point)] = is_visible(v, point, obstacles)
+        tt += time.time() - t
+
+        if visibility[(v, point)]:
+            return dist, v, tt
+
+    return sys.maxsize, None, tt
+
+
+# Given the numerical problems of pyvisgraph we must implement our own visibility
+def is_visible(P1, P2, obstacles):
+    '''
+    Whether the ground segment P1P2 crosses none of the footprints. 'obstacles' are the footprints, their
+    sides as given by get_footprint_edges, or an EdgeIndex of them, which saves building them on every call
+
+    Only the sides of each footprint (its convex polygon) are tested, where every pair of its points used to be,
+    diagonals included. The answer is the same for a segment with an end outside the footprints, as all the
+    nodes of the ground graph are, but a segment lying wholly inside a footprint is now visible
+    '''
+    if isinstance(obstacles, EdgeIndex):
+        return obstacles.is_visible(P1, P2)
+
+    edges = obstacles if isinstance(obstacles, np.ndarray) else get_footprint_edges(obstacles)
+    return bool(visible_segments(P1, P2, edges))
+
+
+def get_footprint_edges(footprints):
+    '''
+    (E, 2, 2) array with the sides of the footprints, each taken as the convex polygon of its points
+    '''
+    edges = []
+    for obs in footprints:
+        order = convex_polygon_order(obs)
+        edges += [(obs[i][:2], obs[j][:2]) for i, j in zip(order, order[1:] + order[:1])]
+
+    return np.array(edges, dtype=float).reshape(-1, 2, 2)
+
+
+def visible_segments(P1, P2, edges):
+    '''
+    is_visible of the segments P1[k]P2[k] against all the (E, 2, 2) 'edges' at once: one point or an (M, 2) array
+    on each side gives a bool or an (M,) array. Each pair is decided as do_intersect does, collinear cases included
+    '''
+    P1 = np.asarray(P1, dtype=float)[..., None, :2]
+    P2 = np.asarray(P2, dtype=float)[..., None, :2]
+
+    return ~segments_intersect(edges[:, 0], edges[:, 1], P1, P2).any(axis=-1)
+
+
+def sweep_visible(point, targets, edges, tol=1e-6):
+    '''
+    visible_segments from one point to many targets by a rotational sweep around the point: with the targets sorted
+    by direction, each edge is only paired with the run of targets inside the angle it spans (widened by 'tol'), 
+    and only those pairs are tested. Edges touching the point and targets on it are paired with everything, so the
+    (M,) result is the one visible_segments gives, in O((M + E) log M) plus the pairs tested
+    '''
+    visible = np.ones(len(targets), dtype=bool)
+    if len(targets) == 0 or len(edges) == 0:
+        return visible
+
+    p = np.asarray(point, dtype=float)[:2]
+    targets = np.asarray(targets, dtype=float).reshape(len(targets), -1)[:, :2]
+
+    a, b = edges[:, 0] - p, edges[:, 1] - p
+    alpha, beta = np.arctan2(a[:, 1], a[:, 0]), np.arctan2(b[:, 1], b[:, 0])
+    width = np.mod(beta - alpha + math.pi, 2*math.pi) - math.pi
+    lo = np.where(width >= 0, alpha, beta) - tol
+    hi = lo + np.abs(width) + 2*tol
+
+    # directions are unreliable next to the point (rounding over the distance stays well below tol farther away),
+    # and an edge through the point spans half a turn
+    near = 1e-12 * (1 + np.abs(p).max()) / tol
+    close = (np.minimum(np.hypot(a[:, 0], a[:, 1]), np.hypot(b[:, 0], b[:, 1])) < near) | (np.abs(width) > math.pi - tol)
+    lo[close], hi[close] = -2*math.pi, 2*math.pi
+
+    # spans across the -pi/pi cut are also swept one turn back or forth
+    forth, back = np.flatnonzero((hi > math.pi) & ~close), np.flatnonzero((lo < -math.pi) & ~close)
+    ids = np.concatenate([np.arange(len(edges)), forth, back])
+    lo = np.concatenate([lo, lo[forth] - 2*math.pi, lo[back] + 2*math.pi])
+    hi = np.concatenate([hi, hi[forth] - 2*math.pi, hi[back] + 2*math.pi])
+
+    d = targets - p
+    theta = np.arctan2(d[:, 1], d[:, 0])
+    theta[np.hypot(d[:, 0], d[:, 1]) < near] = np.nan
+    order = np.argsort(theta)
+    sorted_theta = theta[order]
+    n = len(targets) - np.count_nonzero(np.isnan(theta))
+
+    start = np.searchsorted(sorted_theta[:n], lo, "left")
+    end = np.searchsorted(sorted_theta[:n], hi, "right")
+    counts = end - start
+    edge_ids = np.repeat(ids, counts)
+    target_ids = order[np.repeat(start - np.cumsum(counts) + counts, counts) + np.arange(counts.sum())]
+
+    # targets on the point have no direction, they are paired with every edge
+    on_point = order[n:]
+    edge_ids = np.concatenate([edge_ids, np.tile(np.arange(len(edges)), len(on_point))])
+    target_ids = np.concatenate([target_ids, np.repeat(on_point, len(edges))])
+
+    hit = segments_intersect(edges[edge_ids, 0], edges[edge_ids, 1], p, targets[target_ids])
+    visible[target_ids[hit]] = False
+
+    return visible
 
 
 def orientation(p, q, r):
@@ -241,6 +808,41 @@ def do_intersect(p1, q1, p2, q2):
 
 
 
+def orientations(p, q, r):
+    '''
+    orientation of the triplets of (..., 2) arrays as -1 (counterclockwise), 0 (collinear) and 1 (clockwise)
+    '''
+    return np.sign((q[..., 1] - p[..., 1]) * (r[..., 0] - q[..., 0]) - (q[..., 0] - p[..., 0]) * (r[..., 1] - q[..., 1]))
+
+
+def on_segments(p, q, r):
+    '''
+    on_segment of the (..., 2) arrays
+    '''
+    return ((np.minimum(p[..., 0], r[..., 0]) <= q[..., 0]) & (q[..., 0] <= np.maximum(p[..., 0], r[..., 0])) &
+            (np.minimum(p[..., 1], r[..., 1]) <= q[..., 1]) & (q[..., 1] <= np.maximum(p[..., 1], r[..., 1])))
+
+
+def segments_intersect(p1, q1, p2, q2):
+    '''
+    do_intersect of the segments p1q1 and p2q2 given as broadcastable (..., 2) arrays
+    '''
+    o1 = orientations(p1, q1, p2)
+    o2 = orientations(p1, q1, q2)
+    o3 = orientations(p2, q2, p1)
+    o4 = orientations(p2, q2, q1)
+
+    intersect = (o1 != o2) & (o3 != o4)
+
+    # the collinear cases are rare, they are only looked at when some triplet is collinear
+    if not (o1 == 0).any() and not (o2 == 0).any() and not (o3 == 0).any() and not (o4 == 0).any():
+        return intersect
+
+    return (intersect |
+            ((o1 == 0) & on_segments(p1, p2, q1)) | ((o2 == 0) & on_segments(p1, q2, q1)) |
+            ((o3 == 0) & on_segments(p2, p1, q2)) | ((o4 == 0) & on_segments(p2, q1, q2)))
+
+
 def get_obstacles_proj_vertices(ground_obs):
 
     ground_obs_proj, ground_obs_vertices = [], []
@@ -270,3 +872,206 @@ def get_obstacles_proj_vertices(ground_obs):
 
     return ground_obs_proj, ground_obs_vertices
 
+
+class GroundVisibilityIndex:
+    '''
+    Visibility graph between the inflated footprint vertices of a map (CompiledScenario.footprint_vertices seen 
+    through the EdgeIndex of the footprint sides), built once per scenario. The query points, S and the take-off
+    points, are added on top as temporary nodes and removed once the query is answered. Their visibility is checked when a search asks 
+    for it and kept with the node, as the visibility dict of the searches used to keep it
+    '''
+    def __init__(self, footprint_vertices, footprint_index):
+        self.footprint_index = footprint_index
+        self.vertices = list(dict.fromkeys(v for vlist in footprint_vertices for v in vlist))
+        self.edges = {v: set() for v in self.vertices}
+        self.temporary = {}
+
+        for i, u in enumerate(self.vertices[:-1]):
+            others = self.vertices[i+1:]
+            for v, isvis in zip(others, footprint_index.sweep_visible(u, others)):
+                if isvis:
+                    self.edges[u].add(v)
+                    self.edges[v].add(u)
+
+    def __contains__(self, node):
+        return node in self.edges or node in self.temporary
+
+    def __len__(self):
+        return len(self.edges) + len(self.temporary)
+
+    def add_node(self, node):
+        '''
+        Add 'node' as a temporary node, returns False for a node already in the graph
+        '''
+        if node in self:
+            return False
+
+        self.temporary[node] = {}
+        return True
+
+    def add_nodes(self, nodes):
+        '''
+        Add the temporary nodes of a query, returns those that were not in the graph for remove_nodes
+        '''
+        return [node for node in nodes if self.add_node(node)]
+
+    def remove_node(self, node):
+        '''
+        Remove a temporary node with its visibility, the vertices of the map stay
+        '''
+        self.temporary.pop(node, None)
+
+    def remove_nodes(self, nodes):
+        for node in nodes:
+            self.remove_node(node)
+
+    def neighbours(self, node):
+        '''
+        Nodes that may be visible from 'node': the vertices it sees and every temporary node 
+        for a vertex, every node for a temporary one
+        '''
+        if node in self.edges:
+            return [*self.edges[node], *self.temporary]
+
+        return [*self.edges, *self.temporary]
+
+    def is_visible(self, u, v):
+        if u in self.edges and v in self.edges:
+            return v in self.edges[u]
+
+        table = self.temporary[u] if u in self.temporary else self.temporary[v]
+        if (u, v) not in table:
+            table[(u, v)] = self.footprint_index.is_visible(u, v)
+
+        return table[(u, v)]
+
+    def visible_from(self, u, nodes):
+        '''
+        is_visible from u to each of the nodes, those not known yet found in one sweep_visible
+        '''
+        table = lambda v: self.temporary[u] if u in self.temporary else self.temporary[v]
+        unknown = [v for v in nodes if (u not in self.edges or v not in self.edges) and (u, v) not in table(v)]
+        for v, isvis in zip(unknown, self.footprint_index.sweep_visible(u, unknown)):
+            table(v)[(u, v)] = bool(isvis)
+
+        return [self.is_visible(u, v) for v in nodes]
+
+
+class CompiledScenario:
+    '''
+    What the planners derive from a scenario's obstacles, computed once per map instead of once per call:
+    box bounds and grid indices (ObstacleIndex), hull facets and edges for slicing the obstacles with vertical
+    planes, and the ground footprints, their sides with an EdgeIndex, and the inflated footprint vertices of the
+    ground visibility graph (as get_obstacles_proj_vertices, without the vertices repeated by the top and bottom faces), whose
+    GroundVisibilityIndex is built on first use
+    '''
+    __slots__ = ("S", "T", "ground_obstacles", "aerial_obstacles", "ground_index", "aerial_index", "index",
+                 "ground_facets", "aerial_facets", "ground_edges", "aerial_edges", "footprints", "footprint_edges",
+                 "footprint_index", "footprint_vertices", "reaches", "ground_graph")
+
+    def __init__(self, ground_obstacles, aerial_obstacles, S=None, T=None, hull_cache=None):
+        self.S, self.T = S, T
+        self.ground_obstacles, self.aerial_obstacles = ground_obstacles, aerial_obstacles
+
+        self.ground_index = ObstacleIndex(ground_obstacles)
+        self.aerial_index = ObstacleIndex(aerial_obstacles)
+        self.index = ObstacleIndex(list(ground_obstacles) + list(aerial_obstacles))
+
+        hull_cache = HULL_CACHE if hull_cache is None else hull_cache
+        self.ground_facets, self.ground_edges = self.compile_hulls(self.ground_index.obstacles, hull_cache)
+        self.aerial_facets, self.aerial_edges = self.compile_hulls(self.aerial_index.obstacles, hull_cache)
+
+        proj, vertices = get_obstacles_proj_vertices(self.ground_index.obstacles)
+        self.footprints = [list(dict.fromkeys(tuple(v) for v in obs)) for obs in proj]
+        self.footprint_edges = get_footprint_edges(self.footprints)
+        self.footprint_index = EdgeIndex(self.footprint_edges)
+        self.footprint_vertices = [list(dict.fromkeys(obs)) for obs in vertices]
+        self.reaches = {}
+        self.ground_graph = None
+
+    @classmethod
+    def from_dict(cls, scenario):
+        '''
+        Compile a scenario dict as stored in the scenarios/*.pkl files
+        '''
+        return cls(scenario["ground_obstacles"], scenario["aerial_obstacles"], scenario.get("S"), scenario.get("T"))
+
+    @staticmethod
+    def compile_hulls(obstacles, hull_cache=HULL_CACHE):
+        '''
+        (F, 3, 3) hull facets and (E, 2, 3) hull edges of every obstacle, taken from 'hull_cache'
+        so that scenarios compiled again for another target reuse them
+        '''
+        facets, edges = [], []
+        for oi in obstacles:
+            f, e = hull_cache.get_hull(oi)
+            facets.append(f)
+            edges.append(e)
+
+        return facets, edges
+
+    def reach(self, T):
+        '''
+        TetherReach of the target T, built the first time it is asked for
+        '''
+        key = tuple(np.asarray(T, dtype=float))
+        if key not in self.reaches:
+            self.reaches[key] = TetherReach(self, T)
+
+        return self.reaches[key]
+
+    def visibility_graph(self):
+        '''
+        GroundVisibilityIndex of the footprints, built the first time it is asked for
+        '''
+        if self.ground_graph is None:
+            self.ground_graph = GroundVisibilityIndex(self.footprint_vertices, self.footprint_index)
+
+        return self.ground_graph
+
+    @property
+    def ground_bounds(self):
+        return self.ground_index.bounds
+
+    @property
+    def aerial_bounds(self):
+        return self.aerial_index.bounds
+
+
+class TetherReach:
+    '''
+    The obstacles of a CompiledScenario that a tether ending at T can touch: those whose box meets the sphere of
+    radius TETHER_LENGTH around T and the vertical cylinder over the take-off disk (get_top_circ_radious). Built
+    once per target, its indices and hull edges hold the obstacles near T only, however large the map is.
+    '''
+    def __init__(self, scenario, T):
+        self.T = np.asarray(T, dtype=float)
+        self.radius = get_top_circ_radious(T)
+
+        self.ground_ids = self.cull(scenario.ground_index, self.T, self.radius)
+        self.aerial_ids = self.cull(scenario.aerial_index, self.T, self.radius)
+
+        self.ground_index = ObstacleIndex([scenario.ground_index.obstacles[i] for i in self.ground_ids])
+        self.aerial_index = ObstacleIndex([scenario.aerial_index.obstacles[i] for i in self.aerial_ids])
+        self.index = ObstacleIndex(self.ground_index.obstacles + self.aerial_index.obstacles)
+
+        self.ground_edges = [scenario.ground_edges[i] for i in self.ground_ids]
+        self.aerial_edges = [scenario.aerial_edges[i] for i in self.aerial_ids]
+
+    def __len__(self):
+        return len(self.index)
+
+    @staticmethod
+    def cull(index, T, radius):
+        '''
+        Indices, in list order, of the obstacles of 'index' within reach of a tether ending at T
+        '''
+        lo, hi = np.append(T[:2] - radius, -np.inf), np.append(T[:2] + radius, np.inf)
+        ids = index.query(lo, hi)
+        bounds = index.bounds[ids]
+
+        gap = np.maximum(np.maximum(bounds[:, :3] - T, T - bounds[:, 3:]), 0)
+        horizontal = np.hypot(gap[:, 0], gap[:, 1])
+        near = (horizontal <= radius + EPSILON) & (np.hypot(horizontal, gap[:, 2]) <= TETHER_LENGTH + EPSILON)
+
+        return ids[near]